@@ -0,0 +1,80 @@
+"""Shared SQLite connection helpers."""
+
+import sqlite3
+from collections.abc import Mapping
+from pathlib import Path
+
+# Prefix that marks a SQLite URI (e.g. "file:name?mode=memory&cache=shared")
+SQLITE_URI_PREFIX = "file:"
+MEMORY_DB = ":memory:"
+
+# PRAGMAs callers may set through connect(); values are interpolated, so
+# names are whitelisted and values restricted to ints or bare keywords.
+ALLOWED_PRAGMAS = frozenset(
+    {"busy_timeout", "cache_size", "journal_mode", "synchronous", "temp_store"}
+)
+
+
+def is_sqlite_uri(db_path: Path | str) -> bool:
+    """Return True when db_path is a SQLite URI rather than a filesystem path."""
+    return isinstance(db_path, str) and db_path.startswith(SQLITE_URI_PREFIX)
+
+
+def is_memory_db(db_path: Path | str) -> bool:
+    """Return True for ":memory:" and in-memory SQLite URIs."""
+    if db_path == MEMORY_DB:
+        return True
+    return is_sqlite_uri(db_path) and "mode=memory" in str(db_path)
+
+
+def resolve_db_path(db_path: Path | str) -> Path | str:
+    """
+    Normalize a database location.
+
+    Filesystem paths become Path objects; SQLite URIs and ":memory:" are kept
+    as strings so they can be handed to sqlite3 unchanged.
+    """
+    if db_path == MEMORY_DB or is_sqlite_uri(db_path):
+        return str(db_path)
+    return Path(db_path)
+
+
+def _pragma_statement(name: str, value: int | str) -> str:
+    """Build a validated PRAGMA statement."""
+    if name not in ALLOWED_PRAGMAS:
+        raise ValueError(f"Unsupported PRAGMA: {name}")
+    if isinstance(value, bool) or not (
+        isinstance(value, int) or (isinstance(value, str) and value.isalpha())
+    ):
+        raise ValueError(f"Invalid value for PRAGMA {name}: {value!r}")
+    return f"PRAGMA {name}={value}"
+
+
+def connect(
+    db_path: Path | str,
+    check_same_thread: bool = True,
+    pragmas: Mapping[str, int | str] | None = None,
+) -> sqlite3.Connection:
+    """
+    Open a SQLite connection with Row factory.
+
+    Parent directories are created for filesystem paths. SQLite URIs are opened
+    with URI parsing enabled so in-memory shared-cache databases work.
+    Optional pragmas (see ALLOWED_PRAGMAS) are applied before returning;
+    journal_mode is skipped for in-memory databases, which cannot use WAL.
+    """
+    in_memory = is_memory_db(db_path)
+    statements = [
+        _pragma_statement(k, v)
+        for k, v in (pragmas or {}).items()
+        if not (in_memory and k == "journal_mode")
+    ]
+    if isinstance(db_path, Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(
+        db_path, check_same_thread=check_same_thread, uri=is_sqlite_uri(db_path)
+    )
+    conn.row_factory = sqlite3.Row
+    for statement in statements:
+        conn.execute(statement)
+    return conn
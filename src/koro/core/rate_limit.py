@@ -2,11 +2,13 @@
 
 import sqlite3
 import time
+from collections.abc import Callable, Mapping
 from contextlib import contextmanager
 from pathlib import Path
 from threading import Lock
 from typing import Generator, TypedDict
 
+from koro.core import db
 from koro.core.config import DATABASE_PATH, RATE_LIMIT_PER_MINUTE, RATE_LIMIT_SECONDS
 
 
@@ -26,6 +28,8 @@ class RateLimiter:
         cooldown_seconds: float | None = None,
         per_minute_limit: int | None = None,
         db_path: Path | str | None = None,
+        pragmas: Mapping[str, int | str] | None = None,
+        time_fn: Callable[[], float] = time.time,
     ):
         """
         Initialize rate limiter.
@@ -33,7 +37,9 @@ class RateLimiter:
         Args:
             cooldown_seconds: Minimum seconds between messages
             per_minute_limit: Maximum messages per minute
-            db_path: Optional SQLite path for persistence
+            db_path: Optional SQLite path or URI for persistence
+            pragmas: Optional PRAGMAs applied to the DB connection
+            time_fn: Clock returning seconds since the epoch
         """
         self.cooldown_seconds = (
             RATE_LIMIT_SECONDS if cooldown_seconds is None else cooldown_seconds
@@ -41,10 +47,14 @@ class RateLimiter:
         self.per_minute_limit = (
             RATE_LIMIT_PER_MINUTE if per_minute_limit is None else per_minute_limit
         )
-        self.db_path = Path(db_path) if db_path else DATABASE_PATH
+        self.db_path = db.resolve_db_path(db_path) if db_path else DATABASE_PATH
+        self.pragmas = dict(pragmas or {})
+        self._time = time_fn
         self.user_limits: dict[str, UserLimits] = {}
         self._cache_lock = Lock()
         self._reset_epoch = 0
+        self._connection: sqlite3.Connection | None = None
+        self._connection_lock = Lock()
         self._ensure_schema()
 
     def _ensure_schema(self) -> None:
@@ -60,17 +70,25 @@ class RateLimiter:
 
     @contextmanager
     def _get_connection(self) -> Generator[sqlite3.Connection, None, None]:
-        """Open a short-lived DB connection per operation."""
-        conn: sqlite3.Connection = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
-        finally:
-            conn.close()
+        """Get the shared DB connection, committing on success."""
+        with self._connection_lock:
+            if self._connection is None:
+                self._connection = db.connect(
+                    self.db_path, check_same_thread=False, pragmas=self.pragmas
+                )
+            try:
+                yield self._connection
+                self._connection.commit()
+            except Exception:
+                self._connection.rollback()
+                raise
+
+    def close(self) -> None:
+        """Close the shared DB connection."""
+        with self._connection_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
 
     def _load_limits(self, user_id: str) -> UserLimits | None:
         with self._get_connection() as conn:
@@ -119,7 +137,7 @@ class RateLimiter:
         Returns:
             (allowed, message) - If not allowed, message explains why
         """
-        now = time.time()
+        now = self._time()
         user_id_str = str(user_id)
         loaded: UserLimits | None = None
 
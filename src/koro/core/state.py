@@ -1,15 +1,21 @@
 """SQLite-backed state persistence for KoroMind."""
 
+import asyncio
 import json
 import logging
 import sqlite3
-from contextlib import contextmanager
-from datetime import datetime
+from collections.abc import Callable, Mapping
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from pathlib import Path
-from threading import Lock
-from typing import Generator
+from threading import Condition, Lock, RLock, get_ident
+from typing import AsyncGenerator, Generator
 from uuid import uuid4
+from weakref import WeakKeyDictionary
 
+from koro.core import db
 from koro.core.config import (
     DATABASE_PATH,
     SETTINGS_FILE,
@@ -29,9 +35,106 @@ from koro.core.types import (
 # Maximum number of sessions to keep per user (FIFO eviction)
 MAX_SESSIONS = 100
 
+# Stored in PRAGMA user_version once _ensure_schema has run; bump it whenever
+# the schema or its column migrations change.
+SCHEMA_VERSION = 2
+
 logger = logging.getLogger(__name__)
 
 
+@dataclass(eq=False)
+class _PooledConnection:
+    """Connection shared by every StateManager opened on the same database."""
+
+    connection: sqlite3.Connection
+    lock: RLock = field(default_factory=RLock)
+    refs: int = 0
+    schema_ready: bool = False
+    json_migrated: bool = False
+    # Per event loop, held for a whole transaction() block so that loop's
+    # other coroutines queue; asyncio locks cannot be shared across loops.
+    transaction_gates: WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock] = (
+        field(default_factory=WeakKeyDictionary)
+    )
+    # Token of the open transaction() block and the thread running it.
+    active_token: object | None = None
+    transaction_thread: int | None = None
+    transaction_done: Condition = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.transaction_done = Condition(self.lock)
+
+    def transaction_gate(self) -> asyncio.Lock:
+        """Return the running loop's transaction lock for this connection."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            gate = self.transaction_gates.get(loop)
+            if gate is None:
+                gate = self.transaction_gates[loop] = asyncio.Lock()
+            return gate
+
+
+# Tokens of the transaction() blocks the current context is inside. Tasks and
+# to_thread calls started from a block inherit its token; it stops matching
+# once the block exits.
+_transaction_tokens: ContextVar[tuple[object, ...]] = ContextVar(
+    "_transaction_tokens", default=()
+)
+
+
+def _owns_transaction(pooled: _PooledConnection) -> bool:
+    """Return True if the current context is inside pooled's open transaction."""
+    active = pooled.active_token
+    return active is not None and any(t is active for t in _transaction_tokens.get())
+
+
+# Open connections keyed by resolved db_path. ":memory:" is never pooled
+# because each such connection is its own private database.
+_connection_pool: dict[Path | str, _PooledConnection] = {}
+_connection_pool_lock = Lock()
+
+
+def _acquire_connection(
+    db_path: Path | str, pragmas: Mapping[str, int | str]
+) -> _PooledConnection:
+    """Return the pooled connection for db_path, opening it on first use."""
+    if db_path == db.MEMORY_DB:
+        return _PooledConnection(
+            db.connect(db_path, check_same_thread=False, pragmas=pragmas), refs=1
+        )
+    with _connection_pool_lock:
+        pooled = _connection_pool.get(db_path)
+        if pooled is None:
+            pooled = _PooledConnection(
+                db.connect(db_path, check_same_thread=False, pragmas=pragmas)
+            )
+            _connection_pool[db_path] = pooled
+        pooled.refs += 1
+        return pooled
+
+
+def _release_connection(db_path: Path | str, pooled: _PooledConnection) -> None:
+    """Drop one reference and close the connection once nobody holds it."""
+    with _connection_pool_lock:
+        pooled.refs -= 1
+        if pooled.refs > 0:
+            return
+        if _connection_pool.get(db_path) is pooled:
+            del _connection_pool[db_path]
+    with pooled.lock:
+        pooled.connection.close()
+
+
+def close_all_connections() -> None:
+    """Close every pooled connection (for test teardown)."""
+    with _connection_pool_lock:
+        pooled_connections = list(_connection_pool.values())
+        _connection_pool.clear()
+    for pooled in pooled_connections:
+        with pooled.lock:
+            pooled.connection.close()
+
+
 def _default_stt_language() -> str:
     """Resolve safe default STT language from config."""
     try:
@@ -44,30 +147,76 @@ def _default_stt_language() -> str:
         return "auto"
 
 
+def _normalize_mode(value: object) -> Mode:
+    """Coerce a mode setting to Mode."""
+    return value if isinstance(value, Mode) else Mode(value)
+
+
+def _normalize_stt_language(value: object) -> str:
+    """Validate and normalize an stt_language setting."""
+    if not isinstance(value, str):
+        raise ValueError(f"stt_language must be a string, got {type(value).__name__}")
+    return normalize_stt_language_code(value)
+
+
+def _passthrough(value: object) -> object:
+    """Store a setting unchanged."""
+    return value
+
+
+# Settings accepted by update_settings() and how each value is normalized;
+# other keyword arguments are ignored.
+_SETTING_NORMALIZERS: dict[str, Callable[[object], object]] = {
+    "mode": _normalize_mode,
+    "audio_enabled": _passthrough,
+    "voice_speed": _passthrough,
+    "watch_enabled": _passthrough,
+    "model": _passthrough,
+    "stt_language": _normalize_stt_language,
+}
+
+
 class StateManager:
     """Manages user sessions and settings with SQLite persistence."""
 
-    def __init__(self, db_path: Path | str | None = None):
+    def __init__(
+        self,
+        db_path: Path | str | None = None,
+        pragmas: Mapping[str, int | str] | None = None,
+    ):
         """
         Initialize state manager.
 
         Args:
-            db_path: Path to SQLite database (defaults to ~/.koromind/koromind.db)
+            db_path: Path to SQLite database (defaults to ~/.koromind/koromind.db).
+                SQLite URIs such as "file:name?mode=memory&cache=shared" and
+                ":memory:" are also accepted.
+            pragmas: Optional PRAGMAs applied to the shared connection. Managers
+                opened on the same db_path share one pooled connection, so only
+                the first one's pragmas take effect.
         """
         self._using_custom_path = db_path is not None
-        self.db_path = Path(db_path) if db_path else DATABASE_PATH
-        self._connection: sqlite3.Connection | None = None
-        self._connection_lock = Lock()
-        self._ensure_schema()
-        # Only migrate from global JSON files when using default path
-        if not self._using_custom_path:
-            self._migrate_from_json()
+        self.db_path = db.resolve_db_path(db_path) if db_path else DATABASE_PATH
+        self.pragmas = dict(pragmas or {})
+        self._pooled: _PooledConnection | None = None
+        # Schema setup and migration only touch a newly opened connection, so
+        # constructing a manager never runs into another task's transaction.
+        pooled = self._pool()
+        with pooled.lock:
+            if not pooled.schema_ready:
+                self._ensure_schema()
+                pooled.schema_ready = True
+            # Only migrate from global JSON files when using default path
+            if not self._using_custom_path and not pooled.json_migrated:
+                self._migrate_from_json()
+                pooled.json_migrated = True
 
     def _ensure_schema(self) -> None:
         """Create database schema if not exists."""
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-
         with self._get_connection() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
+
             conn.executescript("""
                 CREATE TABLE IF NOT EXISTS sessions (
                     id TEXT PRIMARY KEY,
@@ -84,6 +233,9 @@ class StateManager:
                 CREATE INDEX IF NOT EXISTS idx_sessions_user_current
                 ON sessions(user_id, is_current);
 
+                CREATE INDEX IF NOT EXISTS idx_sessions_user_last_active
+                ON sessions(user_id, last_active);
+
                 CREATE TABLE IF NOT EXISTS settings (
                     user_id TEXT PRIMARY KEY,
                     mode TEXT DEFAULT 'go_all',
@@ -132,28 +284,127 @@ class StateManager:
             if "name" not in session_columns:
                 conn.execute("ALTER TABLE sessions ADD COLUMN name TEXT DEFAULT NULL")
 
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _pool(self) -> _PooledConnection:
+        """Return the pooled connection, acquiring it on first use."""
+        if self._pooled is None:
+            self._pooled = _acquire_connection(self.db_path, self.pragmas)
+        return self._pooled
+
     @contextmanager
     def _get_connection(self) -> Generator[sqlite3.Connection, None, None]:
-        """Get a database connection with row factory."""
-        with self._connection_lock:
-            if self._connection is None:
-                self._connection = sqlite3.connect(
-                    self.db_path, check_same_thread=False
-                )
-                self._connection.row_factory = sqlite3.Row
+        """
+        Get the pooled database connection, committing on success.
+
+        Inside this context's own transaction() the connection is shared and
+        the outermost block commits. Other threads wait for an open
+        transaction to finish; async methods go through _connection() so
+        they never wait here on the event loop thread.
+        """
+        pooled = self._pool()
+        with pooled.lock:
+            if _owns_transaction(pooled):
+                yield pooled.connection
+                return
+            while pooled.transaction_thread is not None:
+                if pooled.transaction_thread == get_ident():
+                    raise RuntimeError(
+                        "StateManager used on a thread with another task's "
+                        "transaction open; use the async methods instead"
+                    )
+                pooled.transaction_done.wait()
             try:
-                yield self._connection
-                self._connection.commit()
+                yield pooled.connection
+                pooled.connection.commit()
             except Exception:
-                self._connection.rollback()
+                pooled.connection.rollback()
+                raise
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncGenerator[sqlite3.Connection, None]:
+        """Get the pooled connection once other tasks' transactions finish."""
+        pooled = self._pool()
+        if _owns_transaction(pooled):
+            with self._get_connection() as conn:
+                yield conn
+            return
+        async with pooled.transaction_gate():
+            with self._get_connection() as conn:
+                yield conn
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncGenerator[None, None]:
+        """
+        Group several state calls into a single SQLite transaction.
+
+        Writes made inside the block, including from tasks it starts, are
+        committed once on exit, or rolled back if it raises. Other
+        coroutines and threads using the same database wait for the block
+        to finish instead of joining it. Nested blocks join the outer one.
+        """
+        pooled = self._pool()
+        if _owns_transaction(pooled):
+            yield
+            return
+        async with pooled.transaction_gate():
+            active = object()
+            with pooled.lock:
+                while pooled.transaction_thread is not None:
+                    pooled.transaction_done.wait()
+                if not pooled.connection.in_transaction:
+                    pooled.connection.execute("BEGIN IMMEDIATE")
+                pooled.active_token = active
+                pooled.transaction_thread = get_ident()
+            token = _transaction_tokens.set((*_transaction_tokens.get(), active))
+            try:
+                yield
+                with pooled.lock:
+                    pooled.connection.commit()
+            except BaseException:
+                with pooled.lock:
+                    pooled.connection.rollback()
                 raise
+            finally:
+                _transaction_tokens.reset(token)
+                with pooled.lock:
+                    pooled.active_token = None
+                    pooled.transaction_thread = None
+                    pooled.transaction_done.notify_all()
+
+    def _reset(self) -> None:
+        """Delete every session, setting and memory row (for tests)."""
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM sessions")
+            conn.execute("DELETE FROM settings")
+            conn.execute("DELETE FROM memory")
 
     def close(self) -> None:
-        """Close the shared database connection."""
-        with self._connection_lock:
-            if self._connection is not None:
-                self._connection.close()
-                self._connection = None
+        """Release this manager's reference to the pooled connection."""
+        pooled, self._pooled = self._pooled, None
+        if pooled is not None:
+            _release_connection(self.db_path, pooled)
+
+    @staticmethod
+    def _evict_old_sessions(conn: sqlite3.Connection, user_id: str) -> None:
+        """
+        FIFO eviction: delete sessions beyond MAX_SESSIONS for a user.
+
+        Only rows past the OFFSET are selected, so the usual case of one
+        session over the limit deletes a single row.
+        """
+        conn.execute(
+            """
+            DELETE FROM sessions
+            WHERE id IN (
+                SELECT id FROM sessions
+                WHERE user_id = ?
+                ORDER BY last_active DESC, rowid DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (user_id, MAX_SESSIONS),
+        )
 
     def _migrate_from_json(self) -> None:
         """Migrate data from legacy JSON files if not already done."""
@@ -260,7 +511,7 @@ class StateManager:
 
     async def get_sessions(self, user_id: str) -> list[Session]:
         """Get all sessions for a user, ordered by last_active descending."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             rows = conn.execute(
                 """
                 SELECT id, user_id, created_at, last_active, name
@@ -285,7 +536,7 @@ class StateManager:
         self, user_id: str, session_id: str
     ) -> SessionStateItem | None:
         """Get a single typed session by ID for a user."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             row = conn.execute(
                 """
                 SELECT id, name, is_current
@@ -307,7 +558,7 @@ class StateManager:
         self, user_id: str, limit: int | None = None
     ) -> UserSessionState:
         """Get typed session state for a user."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             pending_row = conn.execute(
                 "SELECT pending_session_name FROM settings WHERE user_id = ?",
                 (user_id,),
@@ -351,7 +602,7 @@ class StateManager:
         now = datetime.now()
         session_id = str(uuid4())
 
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             # Clear current flag from all user sessions
             conn.execute(
                 "UPDATE sessions SET is_current = 0 WHERE user_id = ?",
@@ -367,19 +618,7 @@ class StateManager:
                 (session_id, user_id, now.isoformat(), now.isoformat(), name),
             )
 
-            # FIFO eviction: remove oldest sessions if exceeding limit
-            conn.execute(
-                """
-                DELETE FROM sessions
-                WHERE user_id = ? AND id NOT IN (
-                    SELECT id FROM sessions
-                    WHERE user_id = ?
-                    ORDER BY last_active DESC
-                    LIMIT ?
-                )
-                """,
-                (user_id, user_id, MAX_SESSIONS),
-            )
+            self._evict_old_sessions(conn, user_id)
 
         return Session(
             id=session_id,
@@ -391,7 +630,7 @@ class StateManager:
 
     async def get_current_session(self, user_id: str) -> Session | None:
         """Get the current session for a user."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             row = conn.execute(
                 """
                 SELECT id, user_id, created_at, last_active, name
@@ -410,9 +649,34 @@ class StateManager:
                 )
             return None
 
+    async def get_current_sessions_bulk(self, user_ids: list[str]) -> dict[str, str]:
+        """
+        Get current session IDs for many users in one query.
+
+        Args:
+            user_ids: Users to look up
+
+        Returns:
+            Mapping of user_id to current session ID; users without a current
+            session are omitted.
+        """
+        if not user_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in user_ids)
+        async with self._connection() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT user_id, id
+                FROM sessions
+                WHERE is_current = 1 AND user_id IN ({placeholders})
+                """,
+                user_ids,
+            ).fetchall()
+        return {row["user_id"]: row["id"] for row in rows}
+
     async def get_session_by_name(self, user_id: str, name: str) -> Session | None:
         """Get a session by name for a user."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             row = conn.execute(
                 """
                 SELECT id, user_id, created_at, last_active, name
@@ -436,7 +700,7 @@ class StateManager:
         """Set the current session for a user."""
         now = datetime.now().isoformat()
 
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             # Clear current flag from all user sessions
             conn.execute(
                 "UPDATE sessions SET is_current = 0 WHERE user_id = ?",
@@ -455,7 +719,7 @@ class StateManager:
 
     async def clear_current_session(self, user_id: str) -> None:
         """Clear the current session for a user (for /new command)."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             conn.execute(
                 "UPDATE sessions SET is_current = 0 WHERE user_id = ?",
                 (user_id,),
@@ -463,7 +727,7 @@ class StateManager:
 
     async def set_pending_session_name(self, user_id: str, name: str | None) -> None:
         """Store an optional name for the next newly created session."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             conn.execute(
                 """
                 INSERT INTO settings (
@@ -487,7 +751,7 @@ class StateManager:
         if not session_id:
             return
 
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             now = datetime.now().isoformat()
             requested_name = session_name.strip() if session_name else None
 
@@ -545,19 +809,7 @@ class StateManager:
                     (session_id, user_id, now, now, applied_name),
                 )
 
-                # FIFO eviction
-                conn.execute(
-                    """
-                    DELETE FROM sessions
-                    WHERE user_id = ? AND id NOT IN (
-                        SELECT id FROM sessions
-                        WHERE user_id = ?
-                        ORDER BY last_active DESC
-                        LIMIT ?
-                    )
-                    """,
-                    (user_id, user_id, MAX_SESSIONS),
-                )
+                self._evict_old_sessions(conn, user_id)
 
             if requested_name:
                 conn.execute(
@@ -569,11 +821,61 @@ class StateManager:
                     (user_id, requested_name),
                 )
 
+    async def update_sessions_bulk(self, pairs: list[tuple[str, str]]) -> None:
+        """
+        Record many (user_id, session_id) updates in one commit.
+
+        Each session is created or touched as with update_session(), and the
+        last pair for each user becomes that user's current session. Session
+        names (including pending ones) are left untouched.
+
+        Args:
+            pairs: (user_id, session_id) tuples in update order
+
+        Raises:
+            sqlite3.IntegrityError: If a session_id belongs to another user;
+                nothing is written.
+        """
+        pairs = [(user_id, session_id) for user_id, session_id in pairs if session_id]
+        if not pairs:
+            return
+        current = dict(pairs)
+        # Step last_active per pair so later updates sort as more recent and
+        # eviction never picks a session that was just made current.
+        now = datetime.now()
+        rows = []
+        for index, (user_id, session_id) in enumerate(pairs):
+            stamp = (now + timedelta(microseconds=index)).isoformat()
+            rows.append((session_id, user_id, stamp, stamp))
+
+        async with self._connection() as conn:
+            upserted = conn.executemany(
+                """
+                INSERT INTO sessions (id, user_id, created_at, last_active, is_current)
+                VALUES (?, ?, ?, ?, 0)
+                ON CONFLICT(id) DO UPDATE SET last_active = excluded.last_active
+                WHERE sessions.user_id = excluded.user_id
+                """,
+                rows,
+            )
+            # The upsert skips ids owned by another user; fail like
+            # update_session() does rather than clearing that user's session.
+            if upserted.rowcount != len(pairs):
+                raise sqlite3.IntegrityError(
+                    "UNIQUE constraint failed: sessions.id (owned by another user)"
+                )
+            conn.executemany(
+                "UPDATE sessions SET is_current = (id = ?) WHERE user_id = ?",
+                [(session_id, user_id) for user_id, session_id in current.items()],
+            )
+            for user_id in current:
+                self._evict_old_sessions(conn, user_id)
+
     # Settings Management
 
     async def get_settings(self, user_id: str) -> UserSettings:
         """Get settings for a user, creating defaults if not exists."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             row = conn.execute(
                 "SELECT mode, audio_enabled, voice_speed, watch_enabled, model, stt_language FROM settings WHERE user_id = ?",
                 (user_id,),
@@ -590,7 +892,9 @@ class StateManager:
                         row["stt_language"],
                         stt_language,
                     )
-                return UserSettings(
+                # Row values are already typed and stt_language normalized
+                # above, so skip pydantic validation on this hot path.
+                return UserSettings.model_construct(
                     mode=Mode(row["mode"]),
                     audio_enabled=bool(row["audio_enabled"]),
                     voice_speed=row["voice_speed"],
@@ -623,32 +927,17 @@ class StateManager:
         # Get current settings first
         current = await self.get_settings(user_id)
 
-        updates: dict[str, object] = {}
-        if "mode" in kwargs:
-            mode_val = kwargs["mode"]
-            updates["mode"] = mode_val if isinstance(mode_val, Mode) else Mode(mode_val)
-        if "audio_enabled" in kwargs:
-            updates["audio_enabled"] = kwargs["audio_enabled"]
-        if "voice_speed" in kwargs:
-            updates["voice_speed"] = kwargs["voice_speed"]
-        if "watch_enabled" in kwargs:
-            updates["watch_enabled"] = kwargs["watch_enabled"]
-        if "model" in kwargs:
-            updates["model"] = kwargs["model"]
-        if "stt_language" in kwargs:
-            raw_stt_language = kwargs["stt_language"]
-            if not isinstance(raw_stt_language, str):
-                raise ValueError(
-                    "stt_language must be a string, "
-                    f"got {type(raw_stt_language).__name__}"
-                )
-            updates["stt_language"] = normalize_stt_language_code(raw_stt_language)
+        updates = {
+            key: normalize(kwargs[key])
+            for key, normalize in _SETTING_NORMALIZERS.items()
+            if key in kwargs
+        }
 
         if updates:
             current = current.model_copy(update=updates)
 
         # Save to database
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             conn.execute(
                 """
                 UPDATE settings
@@ -673,7 +962,7 @@ class StateManager:
     async def store_memory(self, user_id: str, key: str, value: str) -> None:
         """Store a memory entry for a user."""
         now = datetime.now().isoformat()
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             conn.execute(
                 """
                 INSERT INTO memory (user_id, key, value, created_at, updated_at)
@@ -687,7 +976,7 @@ class StateManager:
 
     async def recall_memory(self, user_id: str, key: str) -> str | None:
         """Recall a memory entry for a user."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             row = conn.execute(
                 "SELECT value FROM memory WHERE user_id = ? AND key = ?",
                 (user_id, key),
@@ -696,7 +985,7 @@ class StateManager:
 
     async def list_memories(self, user_id: str) -> list[str]:
         """List all memory keys for a user."""
-        with self._get_connection() as conn:
+        async with self._connection() as conn:
             rows = conn.execute(
                 "SELECT key FROM memory WHERE user_id = ? ORDER BY updated_at DESC",
                 (user_id,),
@@ -6,6 +6,7 @@ as a typed VaultConfig that passes to the Claude SDK via Brain.
 
 import json
 import logging
+import os
 from pathlib import Path
 from typing import Any, Literal
 
@@ -14,16 +15,32 @@ from pydantic import BaseModel, ConfigDict, Field, ValidationInfo, model_validat
 
 logger = logging.getLogger(__name__)
 
+# libyaml's C loader when PyYAML was built with it, else the pure-Python one
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Whole-file contents that YAML parses to None; skipped without the parser
+_EMPTY_YAML = frozenset({b"", b"~", b"null", b"Null", b"NULL"})
+
 
 def _resolve_path(path_str: str, vault_root: Path) -> str:
     """Resolve a relative path against vault root.
 
-    Handles ~ expansion and absolute path preservation.
+    Handles ~ expansion and absolute path preservation. Like pathlib, "." and
+    empty segments are dropped but ".." is kept, so it still follows symlinked
+    directories.
     """
-    p = Path(path_str).expanduser()
-    if p.is_absolute():
-        return str(p)
-    return str(vault_root / p)
+    path = os.path.expanduser(path_str)
+    if not os.path.isabs(path):
+        path = os.path.join(vault_root, path)
+    parts = [part for part in path.split(os.sep) if part not in ("", ".")]
+    return os.sep + os.sep.join(parts)
+
+
+def _resolve_dot_relative(value: str, vault_root: Path) -> str:
+    """Resolve value against vault root only when it starts with "./"."""
+    if value.startswith("./"):
+        return _resolve_path(value, vault_root)
+    return value
 
 
 # --- Typed Configuration Models ---
@@ -38,11 +55,11 @@ class VaultHookCommand(BaseModel):
     command: str
 
     def model_post_init(self, __context: Any) -> None:
-        if __context and self.command.startswith("./"):
+        if __context:
             vault_root = __context.get("vault_root")
             if vault_root:
                 object.__setattr__(
-                    self, "command", _resolve_path(self.command, vault_root)
+                    self, "command", _resolve_dot_relative(self.command, vault_root)
                 )
 
 
@@ -67,10 +84,7 @@ class McpServerConfig(BaseModel):
         if __context and self.args:
             vault_root = __context.get("vault_root")
             if vault_root:
-                resolved = [
-                    _resolve_path(a, vault_root) if a.startswith("./") else a
-                    for a in self.args
-                ]
+                resolved = [_resolve_dot_relative(a, vault_root) for a in self.args]
                 object.__setattr__(self, "args", resolved)
 
 
@@ -97,7 +111,7 @@ class AgentConfig(BaseModel):
             resolved = self.prompt_file
             if __context:
                 vault_root = __context.get("vault_root")
-                if vault_root and not Path(self.prompt_file).is_absolute():
+                if vault_root and not os.path.isabs(self.prompt_file):
                     resolved = _resolve_path(self.prompt_file, vault_root)
             object.__setattr__(self, "prompt_file", resolved)
             # Pre-load file content so Brain never does sync I/O per request
@@ -239,11 +253,19 @@ class Vault:
         logger.debug(f"Loading config from {self.config_file}")
 
         try:
-            with open(self.config_file) as f:
-                raw = yaml.safe_load(f)
+            data = self.config_file.read_bytes()
         except OSError as e:
             logger.error(f"Failed to read {self.config_file}: {e}")
             raise VaultError(f"Failed to read {self.config_file}: {e}") from e
+
+        if data.strip() in _EMPTY_YAML:
+            logger.debug("Config file is empty or null")
+            self._config = self._EMPTY_CONFIG
+            return self._config
+
+        try:
+            # Bytes go straight to the loader, which detects the encoding
+            raw = yaml.load(data, Loader=_YAML_LOADER)
         except yaml.YAMLError as e:
             logger.error(f"Invalid YAML in {self.config_file}: {e}")
             raise VaultError(f"Invalid YAML in {self.config_file}: {e}") from e
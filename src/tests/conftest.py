@@ -2,11 +2,159 @@
 
 from __future__ import annotations
 
-from unittest.mock import AsyncMock, MagicMock
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, call
 
 import pytest
 
-from koro.core.types import BrainResponse
+import koro.core.state as core_state
+
+# RAM-backed parent for tmp_path directories on Linux, so SQLite files created
+# by tests never wait on a block device. Opt in with KORO_TEST_SHM=1; Docker
+# caps /dev/shm at 64 MB by default.
+_SHM_DIR = "/dev/shm"
+_SHM_ENV = "KORO_TEST_SHM"
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    """Point --basetemp at a private /dev/shm directory when opted in."""
+    if os.environ.get(_SHM_ENV) != "1":
+        return
+    if config.option.basetemp or hasattr(config, "workerinput"):
+        # Explicit --basetemp wins; xdist workers inherit the controller's
+        return
+    if os.path.isdir(_SHM_DIR) and os.access(_SHM_DIR, os.W_OK):
+        config.option.basetemp = os.path.join(_SHM_DIR, f"koro-tests-{os.getpid()}")
+        config._koro_shm_basetemp = config.option.basetemp
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Remove the /dev/shm base directory, keeping it if any test failed."""
+    basetemp = getattr(session.config, "_koro_shm_basetemp", None)
+    if basetemp and exitstatus == pytest.ExitCode.OK:
+        shutil.rmtree(basetemp, ignore_errors=True)
+
+
+class AsyncCallRecorder:
+    """
+    Lightweight awaitable stand-in for AsyncMock.
+
+    Records calls with the same ``call_args``/``call_count`` surface as
+    AsyncMock and supports ``return_value`` and ``side_effect``.
+    """
+
+    __slots__ = (
+        "return_value",
+        "side_effect",
+        "call_count",
+        "call_args",
+        "call_args_list",
+    )
+
+    def __init__(self, return_value: Any = None, side_effect: Any = None) -> None:
+        self.return_value = return_value
+        self.side_effect = side_effect
+        self.call_count = 0
+        self.call_args: Any = None
+        self.call_args_list: list[Any] = []
+
+    async def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        self.call_count += 1
+        self.call_args = call(*args, **kwargs)
+        self.call_args_list.append(self.call_args)
+        effect = self.side_effect
+        if effect is not None:
+            if isinstance(effect, BaseException) or (
+                isinstance(effect, type) and issubclass(effect, BaseException)
+            ):
+                raise effect
+            return effect(*args, **kwargs)
+        return self.return_value
+
+    def reset_mock(self) -> None:
+        """Clear recorded calls, keeping return_value and side_effect."""
+        self.call_count = 0
+        self.call_args = None
+        self.call_args_list = []
+
+    def assert_called(self) -> None:
+        assert self.call_count > 0, "Expected call, got none"
+
+    def assert_called_once(self) -> None:
+        assert self.call_count == 1, f"Expected 1 call, got {self.call_count}"
+
+    def assert_called_with(self, *args: Any, **kwargs: Any) -> None:
+        assert self.call_args == call(*args, **kwargs), self.call_args
+
+    def assert_called_once_with(self, *args: Any, **kwargs: Any) -> None:
+        self.assert_called_once()
+        self.assert_called_with(*args, **kwargs)
+
+    def assert_not_called(self) -> None:
+        assert self.call_count == 0, f"Expected no calls, got {self.call_count}"
+
+
+@dataclass(slots=True)
+class _FakeUser:
+    id: int
+    is_bot: bool = False
+
+
+@dataclass(slots=True)
+class _FakeChat:
+    id: int
+    send_message: AsyncCallRecorder = field(default_factory=AsyncCallRecorder)
+    send_chat_action: AsyncCallRecorder = field(default_factory=AsyncCallRecorder)
+
+
+@dataclass(slots=True)
+class _FakeMessage:
+    text: str | None = None
+    message_thread_id: int | None = None
+    voice: Any = None
+    reply_text: AsyncCallRecorder = field(default_factory=AsyncCallRecorder)
+    reply_voice: AsyncCallRecorder = field(default_factory=AsyncCallRecorder)
+    edit_text: AsyncCallRecorder = field(default_factory=AsyncCallRecorder)
+    delete: AsyncCallRecorder = field(default_factory=AsyncCallRecorder)
+
+
+@dataclass(slots=True)
+class _FakeUpdate:
+    effective_user: _FakeUser
+    effective_chat: _FakeChat
+    message: _FakeMessage | None
+    callback_query: Any = None
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _close_pooled_state_connections():
+    """Close StateManager connections still pooled at the end of the session."""
+    yield
+    core_state.close_all_connections()
+
+
+@pytest.fixture(scope="session")
+def shared_state_manager():
+    """
+    Create one StateManager backed by an in-memory database for the session.
+
+    ":memory:" databases are private to their connection, so xdist workers
+    never see each other's state.
+    """
+    manager = core_state.StateManager(db_path=":memory:")
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def state_manager(shared_state_manager):
+    """Provide the session StateManager and empty its tables after each test."""
+    yield shared_state_manager
+    shared_state_manager._reset()
 
 
 @pytest.fixture
@@ -102,14 +250,12 @@ def mock_telegram_context():
     return context
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def make_processing_message():
     """Factory for a processing message with edit_text."""
 
     def _make_processing_message():
-        message = MagicMock()
-        message.edit_text = AsyncMock()
-        return message
+        return _FakeMessage()
 
     return _make_processing_message
 
@@ -127,22 +273,11 @@ def make_update():
         text: str | None = "Hello test",
         voice: MagicMock | None = None,
     ):
-        update = MagicMock()
-        update.effective_user.id = user_id
-        update.effective_user.is_bot = is_bot
-        update.effective_chat.id = chat_id
-        update.effective_chat.send_message = AsyncMock()
-        update.effective_chat.send_chat_action = AsyncMock()
-
-        update.message.message_thread_id = thread_id
-        update.message.text = text
-        update.message.reply_text = AsyncMock()
-        update.message.reply_voice = AsyncMock()
-        update.message.delete = AsyncMock()
-        if voice is not None:
-            update.message.voice = voice
-
-        return update
+        return _FakeUpdate(
+            effective_user=_FakeUser(id=user_id, is_bot=is_bot),
+            effective_chat=_FakeChat(id=chat_id),
+            message=_FakeMessage(text=text, message_thread_id=thread_id, voice=voice),
+        )
 
     return _make_update
 
@@ -210,29 +345,3 @@ def mock_claude_response():
         "num_turns": 1,
         "duration_ms": 500,
     }
-
-
-@pytest.fixture
-def mock_brain():
-    """Create a mock Brain that returns a default BrainResponse."""
-    brain = MagicMock()
-    brain.process_message = AsyncMock(
-        return_value=BrainResponse(
-            text="Test response",
-            session_id="sess-123",
-            audio=None,
-            tool_calls=[],
-            metadata={},
-        )
-    )
-    brain.state_manager = MagicMock()
-    brain.state_manager.get_settings = AsyncMock(
-        return_value=MagicMock(
-            mode=MagicMock(value="go_all"),
-            audio_enabled=True,
-            voice_speed=1.1,
-            watch_enabled=False,
-            model="",
-        )
-    )
-    return brain
@@ -1,7 +1,11 @@
 """Tests for Telegram handler utilities, commands, callbacks, and messages."""
 
 import asyncio
+import logging
 import time
+from dataclasses import dataclass
+from operator import attrgetter
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
@@ -12,27 +16,115 @@ import koro.interfaces.telegram.handlers.commands as commands
 import koro.interfaces.telegram.handlers.messages as messages
 import koro.interfaces.telegram.handlers.utils as utils
 from koro.core.types import BrainResponse, MessageType, UserSettings
-from koro.state import StateManager
+
+# Shared opaque context for handlers that never inspect it
+_CONTEXT = MagicMock()
+
+_DEFAULT_RESPONSE = BrainResponse(
+    text="Test response",
+    session_id="sess-123",
+    audio=None,
+    tool_calls=[],
+    metadata={},
+)
+
+# Long payloads for send_long_message (~5000 chars each)
+_LONG_WORD_TEXT = "word " * 1000
+_LONG_X_TEXT = "x" * 5000
 
 
 @pytest.fixture
-def state_manager(tmp_path):
-    """Create a StateManager with a temp database."""
-    return StateManager(db_path=tmp_path / "test.db")
+def callback_update(make_callback_query):
+    """Callback update from user/chat 12345; tests set callback_query.data."""
+    return SimpleNamespace(
+        callback_query=make_callback_query(None),
+        effective_user=SimpleNamespace(id=12345),
+        effective_chat=SimpleNamespace(id=12345),
+        message=None,
+    )
+
+
+async def _default_settings(_user_id):
+    return UserSettings()
+
+
+async def _settings_without_audio(_user_id):
+    return UserSettings(audio_enabled=False)
+
+
+class _StubLimiter:
+    """Rate limiter stand-in that always returns the same check result."""
+
+    __slots__ = ("result",)
+
+    def __init__(self, allowed: bool = True, message: str = "") -> None:
+        self.result = (allowed, message)
+
+    def check(self, _user_id: int | str) -> tuple[bool, str]:
+        return self.result
+
+
+_OK_LIMITER = _StubLimiter()
+
+
+@dataclass(slots=True)
+class _SharedMocks:
+    """Handler dependencies shared across a module and reset per test."""
+
+    brain: MagicMock
+
+
+@pytest.fixture(scope="module")
+def shared_mocks():
+    """Build the Brain mock once per module."""
+    brain = MagicMock()
+    brain.process_message = AsyncMock()
+    brain.state_manager.get_settings = _default_settings
+    return _SharedMocks(brain=brain)
+
+
+@pytest.fixture(scope="module")
+def shared_processing_msg(make_processing_message):
+    """Build one processing message for the module."""
+    return make_processing_message()
 
 
 @pytest.fixture
-def allow_all_handlers(monkeypatch):
-    """Allow handlers to run for any chat/topic."""
-    monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 0)
-    monkeypatch.setattr(utils, "should_handle_message", lambda _: True)
+def processing_msg(shared_processing_msg):
+    """Shared processing message with its call history cleared."""
+    shared_processing_msg.edit_text.reset_mock()
+    shared_processing_msg.delete.reset_mock()
+    return shared_processing_msg
+
+
+def _patch_messages_deps(monkeypatch, shared_mocks):
+    """Route message handlers to the permissive limiter and shared Brain."""
+    monkeypatch.setattr(messages, "get_rate_limiter", lambda: _OK_LIMITER)
+    monkeypatch.setattr(messages, "get_brain", lambda: shared_mocks.brain)
+
+
+@pytest.fixture(autouse=True, scope="module")
+def _patch_credentials():
+    """Keep command handlers off the real credentials file for the whole module."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(commands, "load_credentials", lambda: {})
+        yield
 
 
 @pytest.fixture
-def clear_pending_approvals():
-    """Clear pending approvals between tests."""
-    messages.pending_approvals.clear()
-    return messages.pending_approvals
+def patch_state_manager(monkeypatch, state_manager):
+    """Route command and callback handlers to the test StateManager."""
+    monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
+    monkeypatch.setattr(callbacks, "get_state_manager", lambda: state_manager)
+
+
+@pytest.fixture(scope="class")
+def allow_all_handlers():
+    """Allow handlers to run for any chat/topic for every test in a class."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(utils, "ALLOWED_CHAT_ID", 0)
+        mp.setattr(utils, "should_handle_message", lambda _: True)
+        yield
 
 
 class TestShouldHandleMessage:
@@ -59,63 +151,70 @@ class TestShouldHandleMessage:
 class TestAuthorizedHandler:
     """Tests for authorized_handler decorator behavior."""
 
+    @pytest.fixture(scope="class")
+    def recorded_handler(self):
+        """Authorized handler plus a dict recording whether its body ran."""
+        state = {"called": False}
+
+        @utils.authorized_handler
+        async def _handler(update, context):
+            state["called"] = True
+            return "ok"
+
+        return _handler, state
+
     @pytest.mark.asyncio
     async def test_callback_uses_callback_message_thread_even_with_sync_answer(
-        self, monkeypatch
+        self, monkeypatch, recorded_handler
     ):
         """Callback updates should use callback message thread regardless of answer() type."""
         monkeypatch.setattr(utils, "TOPIC_ID", "100")
         monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 0)
 
-        called = False
-
-        @utils.authorized_handler
-        async def _handler(update, context):
-            nonlocal called
-            called = True
-            return "ok"
-
-        update = MagicMock()
-        update.message = None
-        update.effective_chat.id = 12345
-        update.callback_query = MagicMock()
-        update.callback_query.answer = MagicMock()  # Sync callable (not coroutine func)
-        update.callback_query.message = MagicMock(spec=Message)
-        update.callback_query.message.message_thread_id = 100
+        handler, state = recorded_handler
+        state["called"] = False
+
+        callback_message = MagicMock(spec=Message)
+        callback_message.message_thread_id = 100
+        update = SimpleNamespace(
+            message=None,
+            effective_chat=SimpleNamespace(id=12345),
+            # Sync answer callable (not coroutine func)
+            callback_query=SimpleNamespace(
+                answer=MagicMock(), message=callback_message
+            ),
+        )
 
-        result = await _handler(update, MagicMock())
+        result = await handler(update, _CONTEXT)
 
         assert result == "ok"
-        assert called is True
+        assert state["called"] is True
 
     @pytest.mark.asyncio
     async def test_callback_wrong_topic_still_answers_with_sync_answer(
-        self, monkeypatch
+        self, monkeypatch, recorded_handler
     ):
         """Rejected callback updates should still answer callback query."""
         monkeypatch.setattr(utils, "TOPIC_ID", "100")
         monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 0)
 
-        called = False
-
-        @utils.authorized_handler
-        async def _handler(update, context):
-            nonlocal called
-            called = True
-            return "ok"
-
-        update = MagicMock()
-        update.message = None
-        update.effective_chat.id = 12345
-        update.callback_query = MagicMock()
-        update.callback_query.answer = MagicMock()
-        update.callback_query.message = MagicMock(spec=Message)
-        update.callback_query.message.message_thread_id = 999
+        handler, state = recorded_handler
+        state["called"] = False
+
+        callback_message = MagicMock(spec=Message)
+        callback_message.message_thread_id = 999
+        update = SimpleNamespace(
+            message=None,
+            effective_chat=SimpleNamespace(id=12345),
+            callback_query=SimpleNamespace(
+                answer=MagicMock(), message=callback_message
+            ),
+        )
 
-        result = await _handler(update, MagicMock())
+        result = await handler(update, _CONTEXT)
 
         assert result is None
-        assert called is False
+        assert state["called"] is False
         update.callback_query.answer.assert_called_once()
 
 
@@ -132,7 +231,8 @@ class TestSendLongMessage:
 
         await utils.send_long_message(update, first_msg, "Short message")
 
-        first_msg.edit_text.assert_called_once_with("Short message")
+        assert first_msg.edit_text.call_count == 1
+        assert first_msg.edit_text.call_args.args == ("Short message",)
 
     @pytest.mark.asyncio
     async def test_long_message_split(self, make_update, make_processing_message):
@@ -140,11 +240,12 @@ class TestSendLongMessage:
         update = make_update()
         first_msg = make_processing_message()
 
-        long_text = "word " * 1000  # ~5000 chars
-        await utils.send_long_message(update, first_msg, long_text, chunk_size=2000)
+        await utils.send_long_message(
+            update, first_msg, _LONG_WORD_TEXT, chunk_size=2000
+        )
 
-        first_msg.edit_text.assert_called_once()
-        assert update.message.reply_text.call_count >= 1
+        assert first_msg.edit_text.call_count == 1
+        assert update.message.reply_text.call_count == 2
 
     @pytest.mark.asyncio
     async def test_chunk_includes_counter(self, make_update, make_processing_message):
@@ -152,43 +253,39 @@ class TestSendLongMessage:
         update = make_update()
         first_msg = make_processing_message()
 
-        long_text = "x" * 5000
-        await utils.send_long_message(update, first_msg, long_text, chunk_size=2000)
+        await utils.send_long_message(update, first_msg, _LONG_X_TEXT, chunk_size=2000)
 
         first_call_text = first_msg.edit_text.call_args.args[0]
-        assert "[1/" in first_call_text
+        assert first_call_text.endswith("\n\n[1/3]")
 
 
+@pytest.mark.usefixtures("allow_all_handlers", "patch_state_manager")
 class TestCommandHandlers:
     """Tests for command handler authentication and responses."""
 
     @pytest.mark.asyncio
     async def test_cmd_new_creates_session(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_new resets current session."""
         await state_manager.update_session("12345", "old_session")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        context = mock_telegram_context
 
         await commands.cmd_new(update, context)
 
         state = await state_manager.get_session_state("12345")
         assert state.current_session_id is None
-        update.message.reply_text.assert_called_once()
+        assert update.message.reply_text.call_count == 1
 
     @pytest.mark.asyncio
     async def test_cmd_new_with_name(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_new with name shows session name."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["my", "session"]
 
         await commands.cmd_new(update, context)
@@ -199,60 +296,46 @@ class TestCommandHandlers:
         assert typed_state.pending_session_name == "my session"
 
     @pytest.mark.asyncio
-    async def test_cmd_continue_with_session(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_continue_with_session(self, make_update, state_manager):
         """cmd_continue shows session info when exists."""
         await state_manager.update_session("12345", "abc12345")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_continue(update, MagicMock())
+        await commands.cmd_continue(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "abc12345" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_continue_without_session(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_continue_without_session(self, make_update):
         """cmd_continue shows message when no session."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_continue(update, MagicMock())
+        await commands.cmd_continue(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "No previous session" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_sessions_empty(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_sessions_empty(self, make_update):
         """cmd_sessions shows empty message when no sessions."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_sessions(update, MagicMock())
+        await commands.cmd_sessions(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "No sessions" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_sessions_lists_sessions(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_sessions_lists_sessions(self, make_update, state_manager):
         """cmd_sessions lists available sessions."""
         await state_manager.update_session("12345", "sess1-abcdef")
         await state_manager.update_session("12345", "sess2-fedcba")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_sessions(update, MagicMock())
+        await commands.cmd_sessions(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "sess1-ab" in call_text
@@ -261,29 +344,21 @@ class TestCommandHandlers:
         assert "Use /switch <name|id-prefix>" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_sessions_shows_pending_name(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_sessions_shows_pending_name(self, make_update, state_manager):
         """cmd_sessions includes pending new-session label."""
         await state_manager.set_pending_session_name("12345", "project-z")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
-        await commands.cmd_sessions(update, MagicMock())
+        update = make_update()
+        await commands.cmd_sessions(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "Pending new session: project-z" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_switch_no_args(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_switch_no_args(self, make_update, mock_telegram_context):
         """cmd_switch shows empty state when no sessions exist."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(chat_id=12345)
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        context = mock_telegram_context
 
         await commands.cmd_switch(update, context)
 
@@ -292,15 +367,13 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_switch_no_args_shows_picker(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_switch without args shows inline selector when sessions exist."""
         await state_manager.update_session("12345", "abc123456789")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(chat_id=12345)
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        context = mock_telegram_context
 
         await commands.cmd_switch(update, context)
 
@@ -311,15 +384,14 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_switch_finds_session(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_switch switches to matching session."""
         await state_manager.update_session("12345", "abc123456789")
         await state_manager.clear_current_session("12345")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["abc"]
 
         await commands.cmd_switch(update, context)
@@ -329,15 +401,14 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_switch_finds_session_by_name(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_switch switches by session name."""
         await state_manager.update_session("12345", "id-1", session_name="alpha")
         await state_manager.update_session("12345", "id-2", session_name="beta")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["alpha"]
 
         await commands.cmd_switch(update, context)
@@ -347,15 +418,14 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_switch_by_name_reports_ambiguous(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_switch reports ambiguity for non-unique name prefix."""
         await state_manager.update_session("12345", "id-1", session_name="project-a")
         await state_manager.update_session("12345", "id-2", session_name="project-b")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["project"]
 
         await commands.cmd_switch(update, context)
@@ -367,14 +437,13 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_switch_not_found(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_switch shows error when session not found."""
         await state_manager.update_session("12345", "abc123")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["xyz"]
 
         await commands.cmd_switch(update, context)
@@ -383,67 +452,51 @@ class TestCommandHandlers:
         assert "not found" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_status_with_session(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_status_with_session(self, make_update, state_manager):
         """cmd_status shows session info."""
         await state_manager.update_session("12345", "abc12345")
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
 
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_status(update, MagicMock())
+        await commands.cmd_status(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "abc12345" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_status_no_session(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_status_no_session(self, make_update):
         """cmd_status shows message when no session."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_status(update, MagicMock())
+        await commands.cmd_status(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "No active session" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_setup_shows_status(
-        self, make_update, allow_all_handlers, monkeypatch
-    ):
+    async def test_cmd_setup_shows_status(self, make_update):
         """cmd_setup shows credentials status."""
-        monkeypatch.setattr(commands, "load_credentials", lambda: {})
-
-        update = make_update(chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_setup(update, MagicMock())
+        await commands.cmd_setup(update, _CONTEXT)
 
-        update.message.reply_text.assert_called_once()
+        assert update.message.reply_text.call_count == 1
         call_kwargs = update.message.reply_text.call_args.kwargs
         assert call_kwargs["parse_mode"] == "Markdown"
 
     @pytest.mark.asyncio
-    async def test_cmd_health_checks_systems(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_health_checks_systems(self, make_update, monkeypatch):
         """cmd_health checks all systems."""
-        mock_voice = MagicMock()
-        mock_voice.health_check.return_value = (True, "OK")
-        mock_claude = MagicMock()
-        mock_claude.health_check.return_value = (True, "OK")
+        mock_voice = SimpleNamespace(health_check=lambda: (True, "OK"))
+        mock_claude = SimpleNamespace(health_check=lambda: (True, "OK"))
 
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
         monkeypatch.setattr(commands, "get_voice_engine", lambda: mock_voice)
         monkeypatch.setattr(commands, "get_claude_client", lambda: mock_claude)
         monkeypatch.setattr(commands, "SANDBOX_DIR", "/tmp/sandbox")
 
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_health(update, MagicMock())
+        await commands.cmd_health(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "Health Check" in call_text
@@ -451,29 +504,21 @@ class TestCommandHandlers:
         assert "Claude" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_settings_shows_menu(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_settings_shows_menu(self, make_update):
         """cmd_settings shows settings menu."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await commands.cmd_settings(update, MagicMock())
+        await commands.cmd_settings(update, _CONTEXT)
 
         call_text = update.message.reply_text.call_args.args[0]
         assert "Settings" in call_text
         assert "STT Language" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_language_shows_current(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_language_shows_current(self, make_update, mock_telegram_context):
         """cmd_language shows current STT language."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        context = mock_telegram_context
 
         await commands.cmd_language(update, context)
 
@@ -483,12 +528,11 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_language_sets_value(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_language updates STT language setting."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["pl"]
 
         await commands.cmd_language(update, context)
@@ -498,12 +542,11 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_language_rejects_invalid(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_language rejects malformed language codes."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["bad/code"]
 
         await commands.cmd_language(update, context)
@@ -513,15 +556,10 @@ class TestCommandHandlers:
         assert "Invalid language code" in update.message.reply_text.call_args.args[0]
 
     @pytest.mark.asyncio
-    async def test_cmd_model_shows_current(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
-    ):
+    async def test_cmd_model_shows_current(self, make_update, mock_telegram_context):
         """cmd_model shows current model."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        context = mock_telegram_context
 
         await commands.cmd_model(update, context)
 
@@ -530,13 +568,11 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_model_sets_value(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_model sets the model."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["claude-test"]
 
         await commands.cmd_model(update, context)
@@ -546,28 +582,25 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_model_rejects_invalid_identifier(
-        self, make_update, allow_all_handlers, state_manager, monkeypatch
+        self, make_update, state_manager, mock_telegram_context
     ):
         """cmd_model rejects invalid model identifier values."""
-        monkeypatch.setattr(commands, "get_state_manager", lambda: state_manager)
-
-        update = make_update(user_id=12345, chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["bad/model"]
 
         await commands.cmd_model(update, context)
 
         settings = await state_manager.get_settings("12345")
         assert settings.model == ""
-        update.message.reply_text.assert_called_once()
+        assert update.message.reply_text.call_count == 1
         assert "Invalid model identifier" in update.message.reply_text.call_args.args[0]
 
     @pytest.mark.asyncio
-    async def test_cmd_claude_token_no_args(self, make_update, allow_all_handlers):
+    async def test_cmd_claude_token_no_args(self, make_update, mock_telegram_context):
         """cmd_claude_token shows usage without args."""
-        update = make_update(chat_id=12345)
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        context = mock_telegram_context
 
         await commands.cmd_claude_token(update, context)
 
@@ -576,11 +609,11 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_claude_token_invalid_format(
-        self, make_update, allow_all_handlers
+        self, make_update, mock_telegram_context
     ):
         """cmd_claude_token rejects invalid token format."""
-        update = make_update(chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["invalid_token"]
 
         await commands.cmd_claude_token(update, context)
@@ -590,15 +623,15 @@ class TestCommandHandlers:
 
     @pytest.mark.asyncio
     async def test_cmd_claude_token_saves_valid(
-        self, make_update, allow_all_handlers, monkeypatch
+        self, make_update, monkeypatch, mock_telegram_context
     ):
         """cmd_claude_token saves valid token."""
         creds = {}
         monkeypatch.setattr(commands, "load_credentials", lambda: creds)
         monkeypatch.setattr(commands, "save_credentials", lambda c: creds.update(c))
 
-        update = make_update(chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["sk-ant-valid-token-123"]
 
         await commands.cmd_claude_token(update, context)
@@ -608,11 +641,10 @@ class TestCommandHandlers:
         assert "saved" in call_text.lower()
 
     @pytest.mark.asyncio
-    async def test_cmd_elevenlabs_key_no_args(self, make_update, allow_all_handlers):
+    async def test_cmd_elevenlabs_key_no_args(self, make_update, mock_telegram_context):
         """cmd_elevenlabs_key shows usage without args."""
-        update = make_update(chat_id=12345)
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        context = mock_telegram_context
 
         await commands.cmd_elevenlabs_key(update, context)
 
@@ -620,10 +652,12 @@ class TestCommandHandlers:
         assert "Usage" in call_text
 
     @pytest.mark.asyncio
-    async def test_cmd_elevenlabs_key_too_short(self, make_update, allow_all_handlers):
+    async def test_cmd_elevenlabs_key_too_short(
+        self, make_update, mock_telegram_context
+    ):
         """cmd_elevenlabs_key rejects short key."""
-        update = make_update(chat_id=12345)
-        context = MagicMock()
+        update = make_update()
+        context = mock_telegram_context
         context.args = ["short"]
 
         await commands.cmd_elevenlabs_key(update, context)
@@ -632,13 +666,17 @@ class TestCommandHandlers:
         assert "Invalid" in call_text or "short" in call_text.lower()
 
 
+@pytest.mark.usefixtures("allow_all_handlers")
 class TestApprovalCallbackHandlers:
     """Tests for approval callback handlers."""
 
+    @pytest.fixture(autouse=True)
+    def clear_pending_approvals(self):
+        """Clear pending approvals between tests."""
+        messages.pending_approvals.clear()
+
     @pytest.mark.asyncio
-    async def test_approval_callback_approves(
-        self, make_callback_query, clear_pending_approvals, allow_all_handlers
-    ):
+    async def test_approval_callback_approves(self, callback_update):
         """Approval callback approves tool use."""
         approval_event = asyncio.Event()
         messages.pending_approvals["test123"] = messages.PendingApproval(
@@ -647,20 +685,16 @@ class TestApprovalCallbackHandlers:
             tool_name="Read",
         )
 
-        query = make_callback_query("approve_test123")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
+        query = callback_update.callback_query
+        query.data = "approve_test123"
 
-        await callbacks.handle_approval_callback(update, MagicMock())
+        await callbacks.handle_approval_callback(callback_update, _CONTEXT)
 
         assert messages.pending_approvals["test123"].approved is True
         query.edit_message_text.assert_called()
 
     @pytest.mark.asyncio
-    async def test_approval_callback_rejects(
-        self, make_callback_query, clear_pending_approvals, allow_all_handlers
-    ):
+    async def test_approval_callback_rejects(self, callback_update):
         """Approval callback rejects tool use."""
         approval_event = asyncio.Event()
         messages.pending_approvals["test456"] = messages.PendingApproval(
@@ -669,537 +703,323 @@ class TestApprovalCallbackHandlers:
             tool_name="Bash",
         )
 
-        query = make_callback_query("reject_test456")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
+        query = callback_update.callback_query
+        query.data = "reject_test456"
 
-        await callbacks.handle_approval_callback(update, MagicMock())
+        await callbacks.handle_approval_callback(callback_update, _CONTEXT)
 
         call_text = query.edit_message_text.call_args.args[0]
         assert "Rejected" in call_text
 
     @pytest.mark.asyncio
-    async def test_approval_callback_expired(
-        self, make_callback_query, clear_pending_approvals, allow_all_handlers
-    ):
+    async def test_approval_callback_expired(self, callback_update):
         """Approval callback handles expired approvals."""
-        query = make_callback_query("approve_expired123")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
+        query = callback_update.callback_query
+        query.data = "approve_expired123"
 
-        await callbacks.handle_approval_callback(update, MagicMock())
+        await callbacks.handle_approval_callback(callback_update, _CONTEXT)
 
         call_text = query.edit_message_text.call_args.args[0]
         assert "expired" in call_text.lower()
 
 
+@pytest.mark.usefixtures("allow_all_handlers")
 class TestMessageHandlers:
     """Tests for voice and text message handlers."""
 
+    @pytest.mark.parametrize(
+        "handler",
+        [messages.handle_voice, messages.handle_text],
+        ids=["voice", "text"],
+    )
+    @pytest.mark.parametrize(
+        "update_kwargs,handles_topic,allowed_chat_id",
+        [
+            ({"is_bot": True}, True, 0),
+            ({"thread_id": 999}, False, 0),
+            ({"chat_id": 99999}, True, 12345),
+        ],
+        ids=["bot", "wrong_topic", "wrong_chat"],
+    )
     @pytest.mark.asyncio
-    async def test_handle_voice_ignores_bot(self, make_update, allow_all_handlers):
-        """handle_voice ignores bot messages."""
-        update = make_update(is_bot=True)
-
-        await messages.handle_voice(update, MagicMock())
-
-        update.message.reply_text.assert_not_called()
-
-    @pytest.mark.asyncio
-    async def test_handle_text_ignores_bot(self, make_update, allow_all_handlers):
-        """handle_text ignores bot messages."""
-        update = make_update(is_bot=True)
-
-        await messages.handle_text(update, MagicMock())
-
-        update.message.reply_text.assert_not_called()
-
-    @pytest.mark.asyncio
-    async def test_handle_voice_ignores_wrong_topic(self, make_update, monkeypatch):
-        """handle_voice ignores wrong topic."""
-        monkeypatch.setattr(utils, "should_handle_message", lambda _: False)
-        update = make_update(thread_id=999)
-
-        await messages.handle_voice(update, MagicMock())
-
-        update.message.reply_text.assert_not_called()
-
-    @pytest.mark.asyncio
-    async def test_handle_text_ignores_wrong_topic(self, make_update, monkeypatch):
-        """handle_text ignores wrong topic."""
-        monkeypatch.setattr(utils, "should_handle_message", lambda _: False)
-        update = make_update(thread_id=999)
-
-        await messages.handle_text(update, MagicMock())
-
-        update.message.reply_text.assert_not_called()
-
-    @pytest.mark.asyncio
-    async def test_handle_voice_ignores_wrong_chat(self, make_update, monkeypatch):
-        """handle_voice ignores unauthorized chat."""
-        monkeypatch.setattr(utils, "should_handle_message", lambda _: True)
-        monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 12345)
-        update = make_update(chat_id=99999)
-
-        await messages.handle_voice(update, MagicMock())
-
-        update.message.reply_text.assert_not_called()
-
-    @pytest.mark.asyncio
-    async def test_handle_text_ignores_wrong_chat(self, make_update, monkeypatch):
-        """handle_text ignores unauthorized chat."""
-        monkeypatch.setattr(utils, "should_handle_message", lambda _: True)
-        monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 12345)
-        update = make_update(chat_id=99999)
+    async def test_handler_ignores_update(
+        self,
+        make_update,
+        monkeypatch,
+        handler,
+        update_kwargs,
+        handles_topic,
+        allowed_chat_id,
+    ):
+        """Voice and text handlers ignore bot, wrong-topic and wrong-chat updates."""
+        monkeypatch.setattr(utils, "should_handle_message", lambda _: handles_topic)
+        monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", allowed_chat_id)
+        update = make_update(**update_kwargs)
 
-        await messages.handle_text(update, MagicMock())
+        await handler(update, _CONTEXT)
 
-        update.message.reply_text.assert_not_called()
+        assert update.message.reply_text.call_count == 0
 
     @pytest.mark.asyncio
-    async def test_handle_voice_rate_limited(
-        self, make_update, allow_all_handlers, monkeypatch
-    ):
+    async def test_handle_voice_rate_limited(self, make_update, monkeypatch):
         """handle_voice respects rate limits."""
-        limiter = MagicMock()
-        limiter.check.return_value = (False, "Please wait")
+        limiter = _StubLimiter(allowed=False, message="Please wait")
         monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
 
-        update = make_update(user_id=12345, chat_id=12345)
+        update = make_update()
 
-        await messages.handle_voice(update, MagicMock())
+        await messages.handle_voice(update, _CONTEXT)
 
-        update.message.reply_text.assert_called_once()
+        assert update.message.reply_text.call_count == 1
         call_text = update.message.reply_text.call_args.args[0]
         assert "wait" in call_text.lower()
 
     @pytest.mark.asyncio
-    async def test_handle_text_rate_limited(
-        self, make_update, allow_all_handlers, monkeypatch
-    ):
+    async def test_handle_text_rate_limited(self, make_update, monkeypatch):
         """handle_text respects rate limits."""
-        limiter = MagicMock()
-        limiter.check.return_value = (False, "Rate limit reached")
+        limiter = _StubLimiter(allowed=False, message="Rate limit reached")
         monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
 
-        update = make_update(user_id=12345, chat_id=12345, text="Hello")
+        update = make_update(text="Hello")
 
-        await messages.handle_text(update, MagicMock())
+        await messages.handle_text(update, _CONTEXT)
 
-        update.message.reply_text.assert_called_once()
+        assert update.message.reply_text.call_count == 1
         call_text = update.message.reply_text.call_args.args[0]
         assert "limit" in call_text.lower()
 
 
+@pytest.mark.usefixtures("allow_all_handlers", "patch_state_manager")
 class TestCallbackHandlers:
     """Tests for callback query handlers."""
 
     @pytest.mark.asyncio
     async def test_settings_callback_ignores_wrong_topic(
-        self, make_callback_query, monkeypatch
+        self, callback_update, monkeypatch
     ):
         """Settings callback ignores updates from wrong topic."""
         monkeypatch.setattr(utils, "should_handle_message", lambda _: False)
         monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 0)
 
-        query = make_callback_query("setting_audio_toggle")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-        update.effective_chat.id = 12345
+        query = callback_update.callback_query
+        query.data = "setting_audio_toggle"
 
-        await callbacks.handle_settings_callback(update, MagicMock())
+        await callbacks.handle_settings_callback(callback_update, _CONTEXT)
 
         query.answer.assert_called_once()
         query.edit_message_text.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_approval_callback_ignores_wrong_chat(
-        self, make_callback_query, monkeypatch
+        self, callback_update, monkeypatch
     ):
         """Approval callback ignores unauthorized chat."""
         monkeypatch.setattr(utils, "should_handle_message", lambda _: True)
         monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 12345)
 
-        query = make_callback_query("approve_test123")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-        update.effective_chat.id = 99999
+        query = callback_update.callback_query
+        query.data = "approve_test123"
+        callback_update.effective_chat.id = 99999
 
-        await callbacks.handle_approval_callback(update, MagicMock())
+        await callbacks.handle_approval_callback(callback_update, _CONTEXT)
 
         query.answer.assert_called_once()
         query.edit_message_text.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_settings_callback_answers_when_data_missing(self, monkeypatch):
+    async def test_settings_callback_answers_when_data_missing(self, callback_update):
         """Settings callback acknowledges callback query when data is missing."""
-        monkeypatch.setattr(utils, "should_handle_message", lambda _: True)
-        monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 0)
-
-        query = MagicMock()
-        query.data = None
-        query.answer = AsyncMock()
-        query.edit_message_text = AsyncMock()
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-        update.effective_chat.id = 12345
+        query = callback_update.callback_query
 
-        await callbacks.handle_settings_callback(update, MagicMock())
+        await callbacks.handle_settings_callback(callback_update, _CONTEXT)
 
         query.answer.assert_called_once()
         query.edit_message_text.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_approval_callback_answers_when_data_missing(self, monkeypatch):
+    async def test_approval_callback_answers_when_data_missing(self, callback_update):
         """Approval callback acknowledges callback query when data is missing."""
-        monkeypatch.setattr(utils, "should_handle_message", lambda _: True)
-        monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 0)
-
-        query = MagicMock()
-        query.data = None
-        query.answer = AsyncMock()
-        query.edit_message_text = AsyncMock()
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-        update.effective_chat.id = 12345
+        query = callback_update.callback_query
 
-        await callbacks.handle_approval_callback(update, MagicMock())
+        await callbacks.handle_approval_callback(callback_update, _CONTEXT)
 
         query.answer.assert_called_once()
         query.edit_message_text.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_switch_callback_answers_when_data_missing(self, monkeypatch):
+    async def test_switch_callback_answers_when_data_missing(self, callback_update):
         """Switch callback acknowledges callback query when data is missing."""
-        monkeypatch.setattr(utils, "should_handle_message", lambda _: True)
-        monkeypatch.setattr(utils, "ALLOWED_CHAT_ID", 0)
+        query = callback_update.callback_query
 
-        query = MagicMock()
-        query.data = None
-        query.answer = AsyncMock()
-        query.edit_message_text = AsyncMock()
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-        update.effective_chat.id = 12345
-
-        await callbacks.handle_switch_callback(update, MagicMock())
+        await callbacks.handle_switch_callback(callback_update, _CONTEXT)
 
         query.answer.assert_called_once()
         query.edit_message_text.assert_not_called()
 
+    @pytest.mark.parametrize(
+        "data,initial,attr,expected,answer",
+        [
+            (
+                "setting_audio_toggle",
+                {"audio_enabled": True},
+                "audio_enabled",
+                False,
+                None,
+            ),
+            ("setting_mode_toggle", {"mode": "go_all"}, "mode.value", "approve", None),
+            ("setting_speed_0.9", {"voice_speed": 1.0}, "voice_speed", 0.9, None),
+            ("setting_lang_pl", {"stt_language": "auto"}, "stt_language", "pl", None),
+            (
+                "setting_lang_zz",
+                {"stt_language": "auto"},
+                "stt_language",
+                "auto",
+                "Unsupported language",
+            ),
+            (
+                "setting_speed_5.0",
+                {"voice_speed": 1.0},
+                "voice_speed",
+                1.0,
+                "Invalid speed range",
+            ),
+        ],
+        ids=[
+            "toggle_audio",
+            "toggle_mode",
+            "set_speed",
+            "set_language",
+            "rejects_unsupported_language",
+            "rejects_invalid_speed",
+        ],
+    )
     @pytest.mark.asyncio
-    async def test_settings_toggle_audio(
-        self, make_callback_query, state_manager, monkeypatch, allow_all_handlers
-    ):
-        """Settings callback toggles audio."""
-        await state_manager.update_settings("12345", audio_enabled=True)
-        monkeypatch.setattr(callbacks, "get_state_manager", lambda: state_manager)
-
-        query = make_callback_query("setting_audio_toggle")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-
-        await callbacks.handle_settings_callback(update, MagicMock())
-
-        settings = await state_manager.get_settings("12345")
-        assert settings.audio_enabled is False
-
-    @pytest.mark.asyncio
-    async def test_settings_toggle_mode(
-        self, make_callback_query, state_manager, monkeypatch, allow_all_handlers
-    ):
-        """Settings callback toggles mode."""
-        await state_manager.update_settings("12345", mode="go_all")
-        monkeypatch.setattr(callbacks, "get_state_manager", lambda: state_manager)
-
-        query = make_callback_query("setting_mode_toggle")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-
-        await callbacks.handle_settings_callback(update, MagicMock())
-
-        settings = await state_manager.get_settings("12345")
-        assert settings.mode.value == "approve"
-
-    @pytest.mark.asyncio
-    async def test_settings_set_speed(
-        self, make_callback_query, state_manager, monkeypatch, allow_all_handlers
-    ):
-        """Settings callback sets voice speed."""
-        await state_manager.update_settings("12345", voice_speed=1.0)
-        monkeypatch.setattr(callbacks, "get_state_manager", lambda: state_manager)
-
-        query = make_callback_query("setting_speed_0.9")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-
-        await callbacks.handle_settings_callback(update, MagicMock())
-
-        settings = await state_manager.get_settings("12345")
-        assert settings.voice_speed == 0.9
-
-    @pytest.mark.asyncio
-    async def test_settings_set_language(
-        self, make_callback_query, state_manager, monkeypatch, allow_all_handlers
-    ):
-        """Settings callback sets STT language."""
-        await state_manager.update_settings("12345", stt_language="auto")
-        monkeypatch.setattr(callbacks, "get_state_manager", lambda: state_manager)
-
-        query = make_callback_query("setting_lang_pl")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-
-        await callbacks.handle_settings_callback(update, MagicMock())
-
-        settings = await state_manager.get_settings("12345")
-        assert settings.stt_language == "pl"
-
-    @pytest.mark.asyncio
-    async def test_settings_rejects_unsupported_language(
-        self, make_callback_query, state_manager, monkeypatch, allow_all_handlers
-    ):
-        """Settings callback rejects unsupported STT language."""
-        await state_manager.update_settings("12345", stt_language="auto")
-        monkeypatch.setattr(callbacks, "get_state_manager", lambda: state_manager)
-
-        query = make_callback_query("setting_lang_zz")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-
-        await callbacks.handle_settings_callback(update, MagicMock())
-
-        settings = await state_manager.get_settings("12345")
-        assert settings.stt_language == "auto"
-        query.answer.assert_called_with("Unsupported language")
-
-    @pytest.mark.asyncio
-    async def test_settings_rejects_invalid_speed(
-        self, make_callback_query, state_manager, monkeypatch, allow_all_handlers
+    async def test_settings_callback(
+        self, callback_update, state_manager, data, initial, attr, expected, answer
     ):
-        """Settings callback rejects invalid speed."""
-        await state_manager.update_settings("12345", voice_speed=1.0)
-        monkeypatch.setattr(callbacks, "get_state_manager", lambda: state_manager)
+        """Settings callback applies valid changes and rejects invalid ones."""
+        await state_manager.update_settings("12345", **initial)
+        query = callback_update.callback_query
+        query.data = data
 
-        query = make_callback_query("setting_speed_5.0")
-        update = MagicMock()
-        update.callback_query = query
-        update.effective_user.id = 12345
-
-        await callbacks.handle_settings_callback(update, MagicMock())
+        await callbacks.handle_settings_callback(callback_update, _CONTEXT)
 
         settings = await state_manager.get_settings("12345")
-        assert settings.voice_speed == 1.0
-        query.answer.assert_called_with("Invalid speed range")
+        assert attrgetter(attr)(settings) == expected
+        if answer is not None:
+            query.answer.assert_called_with(answer)
 
 
+@pytest.mark.usefixtures("allow_all_handlers")
 class TestMessageHandlersFullFlow:
     """Tests for full message handler flow."""
 
+    @pytest.fixture(autouse=True)
+    def _reset_shared_mocks(self, shared_mocks, monkeypatch):
+        """Restore shared mock defaults and route handlers to them."""
+        shared_mocks.brain.reset_mock(return_value=True, side_effect=True)
+        shared_mocks.brain.process_message.return_value = _DEFAULT_RESPONSE
+        _patch_messages_deps(monkeypatch, shared_mocks)
+
     @pytest.mark.asyncio
     async def test_handle_text_full_flow(
-        self,
-        make_update,
-        make_processing_message,
-        allow_all_handlers,
-        mock_brain,
-        monkeypatch,
+        self, make_update, processing_msg, shared_mocks
     ):
         """handle_text routes text through Brain."""
-        limiter = MagicMock()
-        limiter.check.return_value = (True, "")
-
-        monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
-        monkeypatch.setattr(messages, "get_brain", lambda: mock_brain)
+        update = make_update(text="Hello Claude")
+        update.message.reply_text.return_value = processing_msg
 
-        processing_msg = make_processing_message()
-        update = make_update(
-            user_id=12345,
-            chat_id=12345,
-            text="Hello Claude",
-        )
-        update.message.reply_text = AsyncMock(return_value=processing_msg)
+        await messages.handle_text(update, _CONTEXT)
 
-        await messages.handle_text(update, MagicMock())
-
-        mock_brain.process_message.assert_called_once()
-        call_kwargs = mock_brain.process_message.call_args.kwargs
+        shared_mocks.brain.process_message.assert_called_once()
+        call_kwargs = shared_mocks.brain.process_message.call_args.kwargs
         assert call_kwargs["content"] == "Hello Claude"
         assert call_kwargs["content_type"] == MessageType.TEXT
-        processing_msg.edit_text.assert_called()
+        assert processing_msg.edit_text.call_count == 1
 
     @pytest.mark.asyncio
     async def test_handle_text_no_audio_when_disabled(
-        self,
-        make_update,
-        make_processing_message,
-        allow_all_handlers,
-        mock_brain,
-        monkeypatch,
+        self, make_update, processing_msg, shared_mocks, monkeypatch
     ):
         """handle_text skips audio reply when Brain returns no audio."""
-        limiter = MagicMock()
-        limiter.check.return_value = (True, "")
-
-        # Settings with audio disabled
-        mock_brain.state_manager.get_settings = AsyncMock(
-            return_value=UserSettings(audio_enabled=False)
+        monkeypatch.setattr(
+            shared_mocks.brain.state_manager, "get_settings", _settings_without_audio
         )
-        # Brain returns no audio when include_audio=False
-        mock_brain.process_message = AsyncMock(
-            return_value=BrainResponse(
-                text="Response", session_id="sess-123", audio=None
-            )
+        shared_mocks.brain.process_message.return_value = BrainResponse(
+            text="Response", session_id="sess-123", audio=None
         )
 
-        monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
-        monkeypatch.setattr(messages, "get_brain", lambda: mock_brain)
+        update = make_update(text="Hello")
+        update.message.reply_text.return_value = processing_msg
 
-        processing_msg = make_processing_message()
-        update = make_update(user_id=12345, chat_id=12345, text="Hello")
-        update.message.reply_text = AsyncMock(return_value=processing_msg)
+        await messages.handle_text(update, _CONTEXT)
 
-        await messages.handle_text(update, MagicMock())
-
-        call_kwargs = mock_brain.process_message.call_args.kwargs
+        call_kwargs = shared_mocks.brain.process_message.call_args.kwargs
         assert call_kwargs["include_audio"] is False
-        update.message.reply_voice.assert_not_called()
+        assert update.message.reply_voice.call_count == 0
 
     @pytest.mark.asyncio
     async def test_handle_text_sends_audio_when_brain_returns_audio(
-        self,
-        make_update,
-        make_processing_message,
-        allow_all_handlers,
-        mock_brain,
-        monkeypatch,
+        self, make_update, processing_msg, shared_mocks
     ):
         """handle_text sends voice reply when Brain returns audio."""
-        limiter = MagicMock()
-        limiter.check.return_value = (True, "")
-
-        mock_brain.process_message = AsyncMock(
-            return_value=BrainResponse(
-                text="Response",
-                session_id="sess-123",
-                audio=b"audio_data",
-            )
+        shared_mocks.brain.process_message.return_value = BrainResponse(
+            text="Response",
+            session_id="sess-123",
+            audio=b"audio_data",
         )
 
-        monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
-        monkeypatch.setattr(messages, "get_brain", lambda: mock_brain)
-
-        processing_msg = make_processing_message()
-        update = make_update(user_id=12345, chat_id=12345, text="Hello")
-        update.message.reply_text = AsyncMock(return_value=processing_msg)
+        update = make_update(text="Hello")
+        update.message.reply_text.return_value = processing_msg
 
-        await messages.handle_text(update, MagicMock())
+        await messages.handle_text(update, _CONTEXT)
 
-        update.message.reply_voice.assert_called_once_with(voice=b"audio_data")
+        assert update.message.reply_voice.call_count == 1
+        assert update.message.reply_voice.call_args.kwargs == {"voice": b"audio_data"}
 
     @pytest.mark.asyncio
     async def test_handle_voice_routes_through_brain(
-        self,
-        make_update,
-        make_processing_message,
-        make_voice_message,
-        allow_all_handlers,
-        mock_brain,
-        monkeypatch,
+        self, make_update, processing_msg, make_voice_message, shared_mocks
     ):
         """handle_voice sends voice bytes to Brain."""
-        limiter = MagicMock()
-        limiter.check.return_value = (True, "")
+        update = make_update(voice=make_voice_message(audio_bytes=b"voice_data"))
+        update.message.reply_text.return_value = processing_msg
 
-        monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
-        monkeypatch.setattr(messages, "get_brain", lambda: mock_brain)
+        await messages.handle_voice(update, _CONTEXT)
 
-        processing_msg = make_processing_message()
-        update = make_update(
-            user_id=12345,
-            chat_id=12345,
-            voice=make_voice_message(audio_bytes=b"voice_data"),
-        )
-        update.message.reply_text = AsyncMock(return_value=processing_msg)
-
-        await messages.handle_voice(update, MagicMock())
-
-        mock_brain.process_message.assert_called_once()
-        call_kwargs = mock_brain.process_message.call_args.kwargs
+        shared_mocks.brain.process_message.assert_called_once()
+        call_kwargs = shared_mocks.brain.process_message.call_args.kwargs
         assert call_kwargs["content_type"] == MessageType.VOICE
         assert isinstance(call_kwargs["content"], bytes)
 
     @pytest.mark.asyncio
     async def test_handle_voice_error_on_transcription_failure(
-        self,
-        make_update,
-        make_processing_message,
-        make_voice_message,
-        allow_all_handlers,
-        mock_brain,
-        monkeypatch,
+        self, make_update, processing_msg, make_voice_message, shared_mocks
     ):
         """handle_voice shows safe error when Brain raises RuntimeError."""
-        limiter = MagicMock()
-        limiter.check.return_value = (True, "")
-
-        mock_brain.process_message = AsyncMock(
-            side_effect=RuntimeError("Transcription failed")
+        shared_mocks.brain.process_message.side_effect = RuntimeError(
+            "Transcription failed"
         )
 
-        monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
-        monkeypatch.setattr(messages, "get_brain", lambda: mock_brain)
+        update = make_update(voice=make_voice_message())
+        update.message.reply_text.return_value = processing_msg
 
-        processing_msg = make_processing_message()
-        update = make_update(
-            user_id=12345,
-            chat_id=12345,
-            voice=make_voice_message(),
-        )
-        update.message.reply_text = AsyncMock(return_value=processing_msg)
-
-        await messages.handle_voice(update, MagicMock())
+        await messages.handle_voice(update, _CONTEXT)
 
         call_text = processing_msg.edit_text.call_args.args[0]
         assert call_text == messages._USER_ERROR
 
     @pytest.mark.asyncio
     async def test_handle_text_handles_exception(
-        self,
-        make_update,
-        make_processing_message,
-        allow_all_handlers,
-        mock_brain,
-        monkeypatch,
+        self, make_update, processing_msg, shared_mocks
     ):
         """handle_text handles exceptions gracefully with safe error."""
-        limiter = MagicMock()
-        limiter.check.return_value = (True, "")
+        shared_mocks.brain.process_message.side_effect = Exception("Connection failed")
 
-        mock_brain.process_message = AsyncMock(
-            side_effect=Exception("Connection failed")
-        )
+        update = make_update(text="Hello")
+        update.message.reply_text.return_value = processing_msg
 
-        monkeypatch.setattr(messages, "get_rate_limiter", lambda: limiter)
-        monkeypatch.setattr(messages, "get_brain", lambda: mock_brain)
-
-        processing_msg = make_processing_message()
-        update = make_update(user_id=12345, chat_id=12345, text="Hello")
-        update.message.reply_text = AsyncMock(return_value=processing_msg)
-
-        await messages.handle_text(update, MagicMock())
+        await messages.handle_text(update, _CONTEXT)
 
         call_text = processing_msg.edit_text.call_args.args[0]
         assert call_text == messages._USER_ERROR
@@ -1224,11 +1044,12 @@ class TestPendingApprovalsCleanup:
 
         assert approval_id not in messages.pending_approvals
 
-    def test_pending_approvals_max_size_enforced(self):
+    def test_pending_approvals_max_size_enforced(self, monkeypatch):
         """pending_approvals should not exceed max size."""
         messages.pending_approvals.clear()
+        monkeypatch.setattr(messages, "MAX_PENDING_APPROVALS", 5)
 
-        for i in range(messages.MAX_PENDING_APPROVALS + 10):
+        for i in range(15):
             messages.add_pending_approval(
                 f"id_{i}",
                 messages.PendingApproval(
@@ -1238,23 +1059,24 @@ class TestPendingApprovalsCleanup:
                 ),
             )
 
-        assert len(messages.pending_approvals) <= messages.MAX_PENDING_APPROVALS
+        assert len(messages.pending_approvals) == 5
+        assert "id_14" in messages.pending_approvals
 
 
+@pytest.mark.usefixtures("allow_all_handlers")
 class TestExceptionLogging:
     """Tests for proper exception logging instead of silent swallowing."""
 
     @pytest.mark.asyncio
     async def test_message_delete_failure_logged(
-        self, caplog, make_update, allow_all_handlers
+        self, caplog, make_update, mock_telegram_context
     ):
         """Failed message deletion should be logged."""
-        update = make_update(chat_id=12345)
-        update.message.delete = AsyncMock(side_effect=Exception("Cannot delete"))
-        context = MagicMock()
-        context.args = []
+        update = make_update()
+        update.message.delete.side_effect = Exception("Cannot delete")
+        context = mock_telegram_context
 
-        with caplog.at_level("DEBUG"):
+        with caplog.at_level(logging.DEBUG, logger=commands.logger.name):
             await commands.cmd_claude_token(update, context)
 
-        assert "delete" in caplog.text.lower()
+        assert any("delete" in record.getMessage().lower() for record in caplog.records)
@@ -1,11 +1,14 @@
 """Tests for koro.main module."""
 
+import logging
 import sys
-from unittest.mock import AsyncMock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import MagicMock
 
 import pytest
 
 import koro.core.config as config
+from koro.interfaces.telegram import bot as telegram_bot
 from koro.main import main
 
 
@@ -46,17 +49,12 @@ def config_defaults(monkeypatch):
 class TestMainEntryPoint:
     """Tests for the main entry point and interface selection."""
 
-    def test_main_defaults_to_telegram(self, monkeypatch, mock_telegram_bot):
-        """Main entry point defaults to telegram interface."""
-        monkeypatch.setattr(sys, "argv", ["koro"])
-
-        main()
-
-        mock_telegram_bot.run_telegram_bot.assert_called_once()
-
-    def test_main_accepts_telegram_arg(self, monkeypatch, mock_telegram_bot):
-        """Main entry point accepts explicit telegram argument."""
-        monkeypatch.setattr(sys, "argv", ["koro", "telegram"])
+    @pytest.mark.parametrize(
+        "argv", [["koro"], ["koro", "telegram"]], ids=["default", "explicit"]
+    )
+    def test_main_starts_telegram(self, monkeypatch, mock_telegram_bot, argv):
+        """Main entry point runs telegram by default or when asked explicitly."""
+        monkeypatch.setattr(sys, "argv", argv)
 
         main()
 
@@ -104,13 +102,52 @@ class TestTelegramBotErrorHandler:
     @pytest.mark.asyncio
     async def test_error_handler_reports_to_chat(self):
         """error_handler sends a user-friendly message."""
-        from koro.interfaces.telegram.bot import error_handler
+        sent = []
+
+        async def _send_message(*args, **kwargs):
+            sent.append((args, kwargs))
 
-        update = MagicMock()
-        update.effective_chat.send_message = AsyncMock()
-        context = MagicMock()
-        context.error = Exception("boom")
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(send_message=_send_message)
+        )
+        context = SimpleNamespace(error=Exception("boom"))
 
-        await error_handler(update, context)
+        await telegram_bot.error_handler(update, context)
 
-        update.effective_chat.send_message.assert_called_once()
+        assert len(sent) == 1
+
+    @pytest.mark.asyncio
+    async def test_error_handler_logs_errors(self, caplog):
+        """error_handler logs the exception that broke the update."""
+        context = SimpleNamespace(error=Exception("boom"))
+
+        with caplog.at_level(logging.ERROR, logger=telegram_bot.logger.name):
+            await telegram_bot.error_handler(None, context)
+
+        assert any("boom" in record.getMessage() for record in caplog.records)
+
+    def test_error_handler_registered(self, monkeypatch, tmp_path):
+        """run_telegram_bot registers error_handler on the application."""
+        app = MagicMock()
+        builder = MagicMock()
+        builder.token.return_value = builder
+        builder.concurrent_updates.return_value = builder
+        builder.post_init.return_value = builder
+        builder.build.return_value = app
+        monkeypatch.setattr(telegram_bot, "ApplicationBuilder", lambda: builder)
+        monkeypatch.setattr(
+            telegram_bot, "apply_saved_credentials", lambda: (None, None)
+        )
+        monkeypatch.setattr(telegram_bot, "validate_environment", lambda: (True, ""))
+        monkeypatch.setattr(telegram_bot, "TELEGRAM_BOT_TOKEN", "test-token")
+        monkeypatch.setattr(
+            telegram_bot, "check_claude_auth", lambda: (True, "api_key")
+        )
+        monkeypatch.setattr(telegram_bot, "get_state_manager", MagicMock())
+        monkeypatch.setattr(telegram_bot, "setup_logging", lambda: None)
+        monkeypatch.setattr(telegram_bot, "SANDBOX_DIR", str(tmp_path / "sandbox"))
+
+        telegram_bot.run_telegram_bot()
+
+        app.add_error_handler.assert_called_once_with(telegram_bot.error_handler)
+        app.run_polling.assert_called_once()
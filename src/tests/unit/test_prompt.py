@@ -1,86 +1,134 @@
 """Tests for koro.prompt module."""
 
 from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
 
 import koro.core.prompt as prompt
+from koro.core.prompt import PromptManager, build_dynamic_prompt
 from koro.core.types import UserSettings
-from koro.prompt import PromptManager, build_dynamic_prompt
 
+_FIXED_NOW = datetime(2025, 1, 1, 12, 0, 0)
+_FIXED_TIMESTAMP = "Current date and time: 2025-01-01 12:00:00 Wednesday"
+_FAKE_ROOT = Path("/fake")
+
+
+class _FrozenDatetime(datetime):
+    """datetime whose now() always returns _FIXED_NOW."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return _FIXED_NOW
+
+
+@pytest.fixture
+def fake_fs(monkeypatch):
+    """
+    In-memory files served through Path.exists/read_text.
+
+    Maps absolute path strings to contents; other paths hit the real disk.
+    """
+    files: dict[str, str] = {}
+    real_exists = Path.exists
+    real_read_text = Path.read_text
+
+    def _exists(self, *args, **kwargs):
+        return str(self) in files or real_exists(self, *args, **kwargs)
+
+    def _read_text(self, *args, **kwargs):
+        if str(self) in files:
+            return files[str(self)]
+        return real_read_text(self, *args, **kwargs)
 
+    monkeypatch.setattr(Path, "exists", _exists)
+    monkeypatch.setattr(Path, "read_text", _read_text)
+    return files
+
+
+@pytest.fixture
+def prompt_file(request):
+    """Per-test prompt file path under the fake root."""
+    return _FAKE_ROOT / f"{request.node.name}.md"
+
+
+@pytest.fixture
+def prompt_dirs(fake_fs, monkeypatch):
+    """Point prompt config at the fake root with fixed sandbox/working dirs."""
+    monkeypatch.setattr(prompt, "BASE_DIR", _FAKE_ROOT)
+    monkeypatch.setattr(prompt, "SANDBOX_DIR", "/sandbox")
+    monkeypatch.setattr(prompt, "CLAUDE_WORKING_DIR", "/working")
+    monkeypatch.setattr(prompt, "SYSTEM_PROMPT_FILE", "")
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    """Freeze datetime.now() as seen by koro.core.prompt."""
+    monkeypatch.setattr(prompt, "datetime", _FrozenDatetime)
+    return _FIXED_NOW
+
+
+@pytest.mark.usefixtures("prompt_dirs")
 class TestLoadSystemPrompt:
     """Tests for load_system_prompt function."""
 
-    def test_load_from_file(self, tmp_path, monkeypatch):
-        """load_system_prompt reads from file."""
-        prompt_file = tmp_path / "prompt.md"
-        prompt_file.write_text("You are a test assistant.")
+    @pytest.fixture(scope="class")
+    def default_prompt(self):
+        """Build the fallback prompt once, keeping its config patched for the class."""
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(prompt, "SYSTEM_PROMPT_FILE", "")
+            mp.setattr(prompt, "SANDBOX_DIR", "/sandbox")
+            mp.setattr(prompt, "CLAUDE_WORKING_DIR", "/working")
+            yield prompt.load_system_prompt()
+
+    def test_load_from_file(self, fake_fs, prompt_file, monkeypatch):
+        """load_system_prompt reads the configured SYSTEM_PROMPT_FILE."""
+        fake_fs[str(prompt_file)] = "You are a test assistant."
 
         monkeypatch.setattr(prompt, "SYSTEM_PROMPT_FILE", str(prompt_file))
 
-        content = prompt.load_system_prompt(str(prompt_file))
+        content = prompt.load_system_prompt()
         assert content == "You are a test assistant."
 
-    def test_replaces_placeholders(self, tmp_path, monkeypatch):
+    def test_replaces_placeholders(self, fake_fs, prompt_file):
         """load_system_prompt replaces placeholders."""
-        prompt_file = tmp_path / "prompt.md"
-        prompt_file.write_text("Sandbox: {sandbox_dir}, Read: {read_dir}")
-
-        monkeypatch.setattr(prompt, "SANDBOX_DIR", "/test/sandbox")
-        monkeypatch.setattr(prompt, "CLAUDE_WORKING_DIR", "/test/working")
-        monkeypatch.setattr(prompt, "BASE_DIR", tmp_path)
+        fake_fs[str(prompt_file)] = "Sandbox: {sandbox_dir}, Read: {read_dir}"
 
         content = prompt.load_system_prompt(str(prompt_file))
-        assert "/test/sandbox" in content
-        assert "/test/working" in content
+        assert content == "Sandbox: /sandbox, Read: /working"
 
-    def test_fallback_default_when_missing(self, tmp_path, monkeypatch):
+    def test_fallback_default_when_missing(self, default_prompt):
         """load_system_prompt returns default when file missing."""
-        monkeypatch.setattr(prompt, "SYSTEM_PROMPT_FILE", "")
-        monkeypatch.setattr(prompt, "SANDBOX_DIR", "/sandbox")
-        monkeypatch.setattr(prompt, "CLAUDE_WORKING_DIR", "/working")
-
-        content = prompt.load_system_prompt()
-        assert "voice assistant" in content.lower()
-        assert "/sandbox" in content
-        assert "/working" in content
+        assert "voice assistant" in default_prompt.lower()
+        assert "/sandbox" in default_prompt
+        assert "/working" in default_prompt
 
-    def test_relative_path_resolved(self, tmp_path, monkeypatch):
+    def test_relative_path_resolved(self, fake_fs, prompt_file):
         """load_system_prompt resolves relative paths."""
-        prompt_dir = tmp_path / "prompts"
-        prompt_dir.mkdir()
-        prompt_file = prompt_dir / "test.md"
-        prompt_file.write_text("Relative prompt content")
+        relative_path = f"prompts/{prompt_file.name}"
+        fake_fs[str(_FAKE_ROOT / relative_path)] = "Relative prompt content"
 
-        monkeypatch.setattr(prompt, "BASE_DIR", tmp_path)
-
-        content = prompt.load_system_prompt("prompts/test.md")
+        content = prompt.load_system_prompt(relative_path)
         assert content == "Relative prompt content"
 
-    def test_path_traversal_blocked(self, tmp_path, monkeypatch):
+    def test_path_traversal_blocked(self, fake_fs, monkeypatch, default_prompt):
         """load_system_prompt blocks path traversal attempts."""
         # Create a file outside BASE_DIR
-        outside_dir = tmp_path / "outside"
-        outside_dir.mkdir()
-        secret_file = outside_dir / "secret.txt"
-        secret_file.write_text("SECRET DATA")
+        fake_fs[str(_FAKE_ROOT / "outside" / "secret.txt")] = "SECRET DATA"
 
         # Set BASE_DIR to a subdirectory
-        base_dir = tmp_path / "app"
-        base_dir.mkdir()
-
-        monkeypatch.setattr(prompt, "BASE_DIR", base_dir)
-        monkeypatch.setattr(prompt, "SYSTEM_PROMPT_FILE", "")
-        monkeypatch.setattr(prompt, "SANDBOX_DIR", "/sandbox")
-        monkeypatch.setattr(prompt, "CLAUDE_WORKING_DIR", "/working")
+        monkeypatch.setattr(prompt, "BASE_DIR", _FAKE_ROOT / "app")
 
         # Try to access file outside BASE_DIR via path traversal
         content = prompt.load_system_prompt("../outside/secret.txt")
 
         # Should return default prompt, not the secret file
         assert "SECRET DATA" not in content
-        assert "voice assistant" in content.lower()
+        assert content == default_prompt
 
 
+@pytest.mark.usefixtures("frozen_now")
 class TestBuildDynamicPrompt:
     """Tests for build_dynamic_prompt function."""
 
@@ -90,9 +138,7 @@ class TestBuildDynamicPrompt:
 
         result = build_dynamic_prompt(base, UserSettings())
 
-        assert "Current date and time:" in result
-        # Should contain year
-        assert str(datetime.now().year) in result
+        assert _FIXED_TIMESTAMP in result
 
     def test_includes_base_prompt(self):
         """build_dynamic_prompt includes base prompt."""
@@ -129,15 +175,16 @@ class TestBuildDynamicPrompt:
         assert "Base" in result
 
 
+@pytest.mark.usefixtures("prompt_dirs")
 class TestPromptManager:
     """Tests for PromptManager class."""
 
-    def test_lazy_loads_prompt(self, tmp_path, monkeypatch):
+    EXPECTED_DYNAMIC = ("Base content", _FIXED_TIMESTAMP, "Audio responses disabled")
+
+    def test_lazy_loads_prompt(self, fake_fs, prompt_file):
         """PromptManager lazy loads prompt on first access."""
-        prompt_file = tmp_path / "lazy.md"
-        prompt_file.write_text("Lazy loaded prompt")
+        fake_fs[str(prompt_file)] = "Lazy loaded prompt"
 
-        monkeypatch.setattr(prompt, "BASE_DIR", tmp_path)
         manager = PromptManager(str(prompt_file))
 
         # Not loaded yet
@@ -148,49 +195,38 @@ class TestPromptManager:
         assert base_prompt == "Lazy loaded prompt"
         assert manager._base_prompt is not None
 
-    def test_caches_prompt(self, tmp_path, monkeypatch):
+    def test_caches_prompt(self, monkeypatch):
         """PromptManager caches loaded prompt."""
-        prompt_file = tmp_path / "cached.md"
-        prompt_file.write_text("Original content")
-
-        monkeypatch.setattr(prompt, "BASE_DIR", tmp_path)
-        manager = PromptManager(str(prompt_file))
+        loader = MagicMock(side_effect=["Original content", "Modified content"])
+        monkeypatch.setattr(prompt, "load_system_prompt", loader)
+        manager = PromptManager("cached.md")
 
         first = manager.base_prompt
-
-        # Modify file
-        prompt_file.write_text("Modified content")
-
-        # Should still return cached
         second = manager.base_prompt
+
         assert second == first == "Original content"
+        loader.assert_called_once_with("cached.md")
 
-    def test_reload_clears_cache(self, tmp_path, monkeypatch):
+    def test_reload_clears_cache(self, monkeypatch):
         """PromptManager.reload() clears cache."""
-        prompt_file = tmp_path / "reload.md"
-        prompt_file.write_text("Original")
-
-        monkeypatch.setattr(prompt, "BASE_DIR", tmp_path)
-        manager = PromptManager(str(prompt_file))
+        loader = MagicMock(side_effect=["Original", "Modified"])
+        monkeypatch.setattr(prompt, "load_system_prompt", loader)
+        manager = PromptManager("reload.md")
 
         manager.base_prompt  # Load cache
-        prompt_file.write_text("Modified")
-
         manager.reload()
 
         assert manager.base_prompt == "Modified"
+        assert loader.call_count == 2
 
-    def test_get_prompt_returns_dynamic(self, tmp_path, monkeypatch):
+    @pytest.mark.usefixtures("frozen_now")
+    def test_get_prompt_returns_dynamic(self, fake_fs, prompt_file):
         """PromptManager.get_prompt() returns dynamic prompt."""
-        prompt_file = tmp_path / "dynamic.md"
-        prompt_file.write_text("Base content")
+        fake_fs[str(prompt_file)] = "Base content"
 
-        monkeypatch.setattr(prompt, "BASE_DIR", tmp_path)
         manager = PromptManager(str(prompt_file))
         settings = UserSettings(audio_enabled=False)
 
         result = manager.get_prompt(settings)
 
-        assert "Base content" in result
-        assert "Current date and time:" in result
-        assert "Audio responses disabled" in result
+        assert all(token in result for token in self.EXPECTED_DYNAMIC)
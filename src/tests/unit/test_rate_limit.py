@@ -6,23 +6,63 @@ import threading
 import pytest
 
 import koro.core.rate_limit as rate_limit
+from koro.core import db
+
+# Shared-cache memory DBs are private to the process, so xdist workers
+# each get their own copy.
+_DB_URI = "file:rate-limit-test?mode=memory&cache=shared"
+_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -20000,
+    "busy_timeout": 5000,
+}
 
 
 class TestRateLimiter:
     """Tests for RateLimiter class."""
 
-    @pytest.fixture
-    def limiter_factory(self, tmp_path):
-        """Create rate limiters backed by a temp SQLite DB."""
-        db_path = tmp_path / "rate_limits.db"
+    @pytest.fixture(scope="module")
+    def limiter_cache(self):
+        """Rate limiters built so far, keyed by their constructor kwargs."""
+        return {}
 
-        def _make(**kwargs):
-            return rate_limit.RateLimiter(db_path=db_path, **kwargs)
+    @pytest.fixture(scope="module")
+    def limiter_factory(self, limiter_cache, time_controller):
+        """
+        Create rate limiters backed by one in-memory SQLite DB per module.
 
-        return _make
+        A keeper connection holds the shared-cache database open while
+        limiters are created and closed.
+        """
+        keeper = db.connect(_DB_URI)
 
-    @pytest.fixture
-    def time_controller(self, monkeypatch):
+        def _make(**kwargs):
+            key = tuple(sorted(kwargs.items()))
+            if key not in limiter_cache:
+                limiter_cache[key] = rate_limit.RateLimiter(
+                    db_path=_DB_URI,
+                    pragmas=_PRAGMAS,
+                    time_fn=time_controller.time,
+                    **kwargs,
+                )
+            return limiter_cache[key]
+
+        yield _make
+        for limiter in limiter_cache.values():
+            limiter.close()
+        keeper.close()
+
+    @pytest.fixture(autouse=True)
+    def _reset_limiters(self, limiter_cache, time_controller):
+        """Clear limits and rewind the clock left by the previous test."""
+        time_controller.current = 0.0
+        for limiter in limiter_cache.values():
+            limiter.reset_all()
+
+    @pytest.fixture(scope="module")
+    def time_controller(self):
         """Provide a controllable time source for deterministic tests."""
 
         class TimeController:
@@ -35,32 +75,35 @@ class TestRateLimiter:
             def advance(self, seconds: float) -> None:
                 self.current += seconds
 
-        controller = TimeController()
-        monkeypatch.setattr(rate_limit.time, "time", controller.time)
-        return controller
-
-    def test_init_with_defaults(self, limiter_factory):
-        """RateLimiter uses default values."""
-        limiter = limiter_factory()
-
-        assert limiter.cooldown_seconds == 0.5
-        assert limiter.per_minute_limit == 50
-
-    def test_init_with_custom_values(self, limiter_factory):
-        """RateLimiter accepts custom values."""
-        limiter = limiter_factory(cooldown_seconds=5, per_minute_limit=20)
-
-        assert limiter.cooldown_seconds == 5
-        assert limiter.per_minute_limit == 20
+        return TimeController()
+
+    @pytest.mark.parametrize(
+        "kwargs,expected_cooldown,expected_per_minute",
+        [
+            ({}, 0.5, 50),
+            ({"cooldown_seconds": 5, "per_minute_limit": 20}, 5, 20),
+        ],
+        ids=["defaults", "custom"],
+    )
+    def test_basic_invariants(
+        self,
+        time_controller,
+        limiter_factory,
+        kwargs,
+        expected_cooldown,
+        expected_per_minute,
+    ):
+        """Limits are configured, the first message passes and is timestamped."""
+        limiter = limiter_factory(**kwargs)
 
-    def test_first_message_allowed(self, time_controller, limiter_factory):
-        """First message from user is always allowed."""
-        limiter = limiter_factory()
+        assert limiter.cooldown_seconds == expected_cooldown
+        assert limiter.per_minute_limit == expected_per_minute
 
         allowed, message = limiter.check(12345)
 
         assert allowed is True
         assert message == ""
+        assert limiter.user_limits["12345"]["last_message"] == time_controller.current
 
     def test_cooldown_blocks_rapid_messages(self, time_controller, limiter_factory):
         """Messages within cooldown period are blocked."""
@@ -157,14 +200,6 @@ class TestRateLimiter:
 
         assert limiter.user_limits == {}
 
-    def test_check_updates_last_message_time(self, time_controller, limiter_factory):
-        """check() updates last message timestamp."""
-        limiter = limiter_factory()
-
-        limiter.check(12345)
-        last_msg = limiter.user_limits["12345"]["last_message"]
-        assert last_msg == time_controller.current
-
     def test_check_increments_minute_count(self, time_controller, limiter_factory):
         """check() increments minute counter."""
         limiter = limiter_factory(cooldown_seconds=0.01)
@@ -182,10 +217,10 @@ class TestRateLimiter:
         limiter = limiter_factory(cooldown_seconds=10)
 
         limiter.check(12345)
+        time_controller.advance(2.5)
         _, message = limiter.check(12345)
 
-        assert "please wait" in message.lower()
-        assert "s" in message
+        assert message == "Please wait 7.5s before sending another message."
 
     def test_persists_limits_across_instances(self, time_controller, limiter_factory):
         """Rate limits persist when a new instance is created."""
@@ -194,8 +229,14 @@ class TestRateLimiter:
         limiter.check(12345)
         limiter.check(12345)
 
-        new_limiter = limiter_factory(cooldown_seconds=0, per_minute_limit=2)
+        new_limiter = rate_limit.RateLimiter(
+            cooldown_seconds=0,
+            per_minute_limit=2,
+            db_path=limiter.db_path,
+            time_fn=time_controller.time,
+        )
         allowed, _ = new_limiter.check(12345)
+        new_limiter.close()
 
         assert allowed is False
 
@@ -235,3 +276,41 @@ class TestRateLimiter:
 
         assert all(allowed_results)
         assert limiter.user_limits["u-1"]["minute_count"] == 8
+
+    def test_check_reuses_one_connection(
+        self, time_controller, limiter_factory, monkeypatch
+    ):
+        """Repeated checks share the limiter's connection instead of reconnecting."""
+        limiter = limiter_factory(cooldown_seconds=0, per_minute_limit=100)
+        limiter.check(12345)
+        connects = []
+        monkeypatch.setattr(
+            rate_limit.db, "connect", lambda *a, **k: connects.append(a)
+        )
+
+        for _ in range(10):
+            allowed, _ = limiter.check(12345)
+            assert allowed is True
+
+        assert connects == []
+
+    def test_connections_apply_pragmas(self, limiter_factory):
+        """Configured PRAGMAs are applied to every connection."""
+        limiter = limiter_factory()
+
+        with limiter._get_connection() as conn:
+            busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+            synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+
+        assert busy_timeout == 5000
+        assert synchronous == 1  # NORMAL
+
+    @pytest.mark.parametrize(
+        "pragmas",
+        [{"foreign_keys": 1}, {"synchronous": "OFF; DROP TABLE rate_limits"}],
+        ids=["unknown_pragma", "unsafe_value"],
+    )
+    def test_rejects_invalid_pragmas(self, pragmas):
+        """Unknown PRAGMA names and non-keyword values are rejected."""
+        with pytest.raises(ValueError):
+            rate_limit.RateLimiter(db_path=_DB_URI, pragmas=pragmas)
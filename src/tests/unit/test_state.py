@@ -1,16 +1,35 @@
 """Tests for koro.state module."""
 
 import asyncio
+import sqlite3
 
 import pytest
 
+import koro.core.state as core_state
 from koro.state import MAX_SESSIONS, StateManager
 
+_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64000,
+    "busy_timeout": 30000,
+}
+
+
+@pytest.fixture(scope="session")
+def shared_db_file(tmp_path_factory):
+    """One on-disk database path for tests that need a real file."""
+    return tmp_path_factory.mktemp("koro") / "state.db"
+
 
 @pytest.fixture
-def state_manager(tmp_path):
-    """Create a StateManager with a temp database."""
-    return StateManager(db_path=tmp_path / "test.db")
+def db_file(shared_db_file):
+    """Provide the shared database path and empty its tables after each test."""
+    yield shared_db_file
+    manager = StateManager(db_path=shared_db_file)
+    manager._reset()
+    manager.close()
 
 
 class TestStateManager:
@@ -24,13 +43,65 @@ class TestStateManager:
         assert manager.db_path == db_file
         assert db_file.exists()
 
+    def test_init_records_schema_version(self, state_manager):
+        """Schema creation stamps user_version so later opens skip the DDL."""
+        with state_manager._get_connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+        assert version == core_state.SCHEMA_VERSION
+
+    def test_init_applies_pragmas(self, tmp_path):
+        """StateManager applies configured PRAGMAs to file-backed databases."""
+        manager = StateManager(db_path=tmp_path / "test.db", pragmas=_PRAGMAS)
+
+        with manager._get_connection() as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+        manager.close()
+
+        assert journal_mode == "wal"
+        assert synchronous == 1  # NORMAL
+
     @pytest.mark.asyncio
-    async def test_get_session_state_creates_default(self, state_manager):
-        """get_session_state creates default state for new user."""
-        state = await state_manager.get_session_state("99999")
+    async def test_init_with_sqlite_uri(self, tmp_path, monkeypatch):
+        """StateManager accepts shared in-memory SQLite URIs without touching disk."""
+        monkeypatch.chdir(tmp_path)
+        uri = "file:state-uri-test?mode=memory&cache=shared"
+        manager1 = StateManager(db_path=uri)
+        manager2 = StateManager(db_path=uri)
 
-        assert state.current_session_id is None
-        assert state.sessions == []
+        await manager1.update_settings("12345", audio_enabled=False)
+        settings = await manager2.get_settings("12345")
+
+        assert manager1.db_path == uri
+        assert settings.audio_enabled is False
+        assert list(tmp_path.iterdir()) == []
+        manager1.close()
+        manager2.close()
+
+    def test_managers_share_pooled_connection(self, db_file):
+        """Managers on one db_path reuse a connection until the last closes."""
+        manager1 = StateManager(db_path=db_file)
+        manager2 = StateManager(db_path=db_file)
+
+        with manager1._get_connection() as conn1, manager2._get_connection() as conn2:
+            assert conn1 is conn2
+
+        manager1.close()
+        assert db_file in core_state._connection_pool
+        manager2.close()
+        assert db_file not in core_state._connection_pool
+
+    def test_memory_managers_are_not_pooled(self):
+        """Each ":memory:" manager keeps its own private database."""
+        manager1 = StateManager(db_path=":memory:")
+        manager2 = StateManager(db_path=":memory:")
+
+        with manager1._get_connection() as conn1, manager2._get_connection() as conn2:
+            assert conn1 is not conn2
+
+        manager1.close()
+        manager2.close()
 
     @pytest.mark.asyncio
     async def test_get_settings_creates_defaults(self, state_manager):
@@ -44,44 +115,46 @@ class TestStateManager:
         assert settings.model == ""
         assert settings.stt_language == "auto"
 
-    @pytest.mark.parametrize(
-        "key,value,expected_attr,expected_value",
-        [
-            ("audio_enabled", False, "audio_enabled", False),
-            ("mode", "approve", "mode", "approve"),
-            ("voice_speed", 0.9, "voice_speed", 0.9),
-            ("watch_enabled", True, "watch_enabled", True),
-            ("model", "claude-test", "model", "claude-test"),
-            ("stt_language", "pl", "stt_language", "pl"),
-        ],
-    )
-    @pytest.mark.asyncio
-    async def test_update_settings_saves(
-        self, state_manager, key, value, expected_attr, expected_value
-    ):
-        """update_settings updates and saves settings."""
-        await state_manager.update_settings("12345", **{key: value})
-
-        settings = await state_manager.get_settings("12345")
-        actual = getattr(settings, expected_attr)
-        # Mode is an enum, compare values
-        if expected_attr == "mode":
-            actual = actual.value
-        assert actual == expected_value
+    @pytest.mark.asyncio
+    async def test_update_settings_saves(self, state_manager):
+        """update_settings applies each setting and returns the result."""
+        cases = [
+            ("audio_enabled", False),
+            ("mode", "approve"),
+            ("voice_speed", 0.9),
+            ("watch_enabled", True),
+            ("model", "claude-test"),
+            ("stt_language", "pl"),
+        ]
+        user_ids = [str(uid) for uid in range(len(cases))]
+
+        saved = await asyncio.gather(
+            *(
+                state_manager.update_settings(uid, **{key: value})
+                for uid, (key, value) in zip(user_ids, cases)
+            )
+        )
+
+        for settings, (key, value) in zip(saved, cases):
+            actual = getattr(settings, key)
+            # Mode is an enum, compare values
+            if key == "mode":
+                actual = actual.value
+            assert actual == value, key
 
     @pytest.mark.asyncio
-    async def test_settings_persist_after_recreation(self, tmp_path):
+    async def test_settings_persist_after_recreation(self, db_file):
         """Settings persist across StateManager instances."""
-        db_file = tmp_path / "test.db"
-
-        manager1 = StateManager(db_path=db_file)
-        await manager1.update_settings("12345", audio_enabled=False)
-        await manager1.update_settings("12345", mode="approve")
-        await manager1.update_settings("12345", stt_language="pl")
+        manager1 = StateManager(db_path=db_file, pragmas=_PRAGMAS)
+        await manager1.update_settings(
+            "12345", audio_enabled=False, mode="approve", stt_language="pl"
+        )
+        manager1.close()
 
         # Create new instance with same db
-        manager2 = StateManager(db_path=db_file)
+        manager2 = StateManager(db_path=db_file, pragmas=_PRAGMAS)
         settings = await manager2.get_settings("12345")
+        manager2.close()
 
         assert settings.audio_enabled is False
         assert settings.mode.value == "approve"
@@ -117,7 +190,7 @@ class TestStateManagerAsync:
         await state_manager.update_session("12345", "abc")
 
         state = await state_manager.get_session_state("12345")
-        assert [session.id for session in state.sessions].count("abc") == 1
+        assert [session.id for session in state.sessions] == ["abc"]
 
     @pytest.mark.asyncio
     async def test_create_session(self, state_manager):
@@ -138,6 +211,18 @@ class TestStateManagerAsync:
         assert current is not None
         assert current.id == created.id
 
+    @pytest.mark.asyncio
+    async def test_get_current_sessions_bulk(self, state_manager):
+        """get_current_sessions_bulk maps users to current sessions in one call."""
+        await state_manager.update_session("1", "sess-1")
+        await state_manager.update_session("2", "sess-2a")
+        await state_manager.update_session("2", "sess-2b")
+
+        current = await state_manager.get_current_sessions_bulk(["1", "2", "3"])
+
+        assert current == {"1": "sess-1", "2": "sess-2b"}
+        assert await state_manager.get_current_sessions_bulk([]) == {}
+
     @pytest.mark.asyncio
     async def test_get_current_session_none_for_new_user(self, state_manager):
         """get_current_session returns None for user without sessions."""
@@ -253,16 +338,6 @@ class TestStateManagerAsync:
 
         assert len(sessions) == 3
 
-    @pytest.mark.asyncio
-    async def test_get_settings_async(self, state_manager):
-        """get_settings returns UserSettings object."""
-        settings = await state_manager.get_settings("12345")
-
-        assert settings.audio_enabled is True
-        assert settings.mode.value == "go_all"
-        assert settings.model == ""
-        assert settings.stt_language == "auto"
-
     @pytest.mark.asyncio
     async def test_update_settings_async(self, state_manager):
         """update_settings updates and returns UserSettings."""
@@ -283,24 +358,208 @@ class TestStateManagerAsync:
             await state_manager.update_settings("12345", stt_language=123)
 
 
+class TestStateManagerTransactions:
+    """Tests for grouping state calls into one transaction."""
+
+    @pytest.mark.asyncio
+    async def test_transaction_commits_once_on_exit(self, state_manager):
+        """Writes inside transaction() are committed together."""
+        async with state_manager.transaction():
+            await state_manager.update_settings("12345", audio_enabled=False)
+            await state_manager.update_session("12345", "sess-1")
+            with state_manager._get_connection() as conn:
+                assert conn.in_transaction
+
+        with state_manager._get_connection() as conn:
+            assert not conn.in_transaction
+        settings = await state_manager.get_settings("12345")
+        state = await state_manager.get_session_state("12345")
+        assert settings.audio_enabled is False
+        assert state.current_session_id == "sess-1"
+
+    @pytest.mark.asyncio
+    async def test_transaction_rolls_back_on_error(self, state_manager):
+        """An exception inside transaction() discards its writes."""
+        with pytest.raises(RuntimeError):
+            async with state_manager.transaction():
+                await state_manager.update_session("12345", "sess-1")
+                raise RuntimeError("boom")
+
+        state = await state_manager.get_session_state("12345")
+        assert state.sessions == []
+
+    @pytest.mark.asyncio
+    async def test_other_task_writes_survive_rollback(self, state_manager):
+        """Another task's write waits for the transaction instead of joining it."""
+        opened = asyncio.Event()
+
+        async def owner():
+            with pytest.raises(RuntimeError):
+                async with state_manager.transaction():
+                    await state_manager.update_settings("alice", audio_enabled=False)
+                    opened.set()
+                    await asyncio.sleep(0.01)
+                    raise RuntimeError("boom")
+
+        async def other():
+            await opened.wait()
+            await state_manager.update_settings("bob", audio_enabled=False)
+
+        await asyncio.gather(owner(), other())
+
+        alice = await state_manager.get_settings("alice")
+        bob = await state_manager.get_settings("bob")
+        assert alice.audio_enabled is True
+        assert bob.audio_enabled is False
+
+    @pytest.mark.asyncio
+    async def test_task_outliving_transaction_commits_its_writes(self, db_file):
+        """A task started in the block no longer joins it once the block exits."""
+        manager = StateManager(db_path=db_file)
+        release = asyncio.Event()
+
+        async def late_write():
+            await release.wait()
+            await manager.store_memory("12345", "late", "value")
+
+        async with manager.transaction():
+            task = asyncio.create_task(late_write())
+        release.set()
+        await task
+
+        with manager._get_connection() as conn:
+            assert not conn.in_transaction
+        other = sqlite3.connect(db_file)
+        row = other.execute("SELECT value FROM memory WHERE key = 'late'").fetchone()
+        other.close()
+        manager.close()
+
+        assert row == ("value",)
+
+    def test_transactions_on_separate_event_loops(self, db_file):
+        """Each event loop queues behind transaction() with its own lock."""
+        manager = StateManager(db_path=db_file)
+
+        async def run(user_id):
+            async def writer():
+                async with manager.transaction():
+                    await manager.update_settings(user_id, audio_enabled=False)
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(writer(), manager.get_settings(user_id))
+            return await manager.get_settings(user_id)
+
+        first = asyncio.run(run("alice"))
+        second = asyncio.run(run("bob"))
+        manager.close()
+
+        assert first.audio_enabled is False
+        assert second.audio_enabled is False
+
+    @pytest.mark.asyncio
+    async def test_new_manager_during_other_tasks_transaction(self, db_file):
+        """Opening a manager on a database with an open transaction works."""
+        manager = StateManager(db_path=db_file)
+        opened = asyncio.Event()
+        release = asyncio.Event()
+
+        async def owner():
+            async with manager.transaction():
+                await manager.update_settings("alice", audio_enabled=False)
+                opened.set()
+                await release.wait()
+
+        task = asyncio.create_task(owner())
+        await opened.wait()
+        other = StateManager(db_path=db_file)
+        release.set()
+        await task
+        settings = await other.get_settings("alice")
+        other.close()
+        manager.close()
+
+        assert settings.audio_enabled is False
+
+
 class TestStateManagerConcurrency:
     """Tests for StateManager thread safety."""
 
     @pytest.mark.asyncio
-    async def test_concurrent_session_updates_no_corruption(self, state_manager):
+    @pytest.mark.parametrize("count", [2, 5, 20])
+    async def test_concurrent_session_updates_no_corruption(self, state_manager, count):
         """Concurrent updates should not corrupt state."""
 
         async def update_session(user_id, session_id):
             await state_manager.update_session(str(user_id), session_id)
 
-        # Run 50 concurrent updates
-        tasks = [update_session(i, f"session_{i}") for i in range(50)]
+        tasks = [update_session(i, f"session_{i}") for i in range(count)]
         await asyncio.gather(*tasks)
 
         # Verify all sessions exist
-        for i in range(50):
-            state = await state_manager.get_session_state(str(i))
-            assert state.current_session_id == f"session_{i}"
+        current = await state_manager.get_current_sessions_bulk(
+            [str(i) for i in range(count)]
+        )
+        assert current == {str(i): f"session_{i}" for i in range(count)}
+
+    @pytest.mark.asyncio
+    async def test_update_sessions_bulk(self, state_manager):
+        """update_sessions_bulk records 50 updates in one call."""
+        await state_manager.update_sessions_bulk(
+            [(str(i), f"session_{i}") for i in range(50)]
+        )
+
+        current = await state_manager.get_current_sessions_bulk(
+            [str(i) for i in range(50)]
+        )
+        assert current == {str(i): f"session_{i}" for i in range(50)}
+
+    @pytest.mark.asyncio
+    async def test_update_sessions_bulk_last_pair_is_current(self, state_manager):
+        """The last pair per user wins; earlier sessions are kept."""
+        await state_manager.update_session("12345", "session_old")
+        await state_manager.update_sessions_bulk(
+            [("12345", "session_a"), ("12345", "session_b")]
+        )
+
+        state = await state_manager.get_session_state("12345")
+        assert state.current_session_id == "session_b"
+        assert {session.id for session in state.sessions} == {
+            "session_old",
+            "session_a",
+            "session_b",
+        }
+
+    @pytest.mark.asyncio
+    async def test_update_sessions_bulk_keeps_retouched_current(self, state_manager):
+        """A session re-touched at the end of a full batch is kept as current."""
+        pairs = [("12345", f"session_{i}") for i in range(MAX_SESSIONS + 1)]
+        await state_manager.update_sessions_bulk([*pairs, ("12345", "session_0")])
+
+        state = await state_manager.get_session_state("12345")
+        session_ids = {session.id for session in state.sessions}
+        assert state.current_session_id == "session_0"
+        assert len(session_ids) == MAX_SESSIONS
+        assert "session_0" in session_ids
+        assert "session_1" not in session_ids
+
+    @pytest.mark.asyncio
+    async def test_update_sessions_bulk_rejects_other_users_session(
+        self, state_manager
+    ):
+        """A session id owned by another user fails like update_session()."""
+        await state_manager.update_session("alice", "shared")
+        await state_manager.update_session("bob", "bob_session")
+
+        with pytest.raises(sqlite3.IntegrityError):
+            await state_manager.update_sessions_bulk(
+                [("bob", "bob_new"), ("bob", "shared")]
+            )
+
+        alice = await state_manager.get_session_state("alice")
+        bob = await state_manager.get_session_state("bob")
+        assert alice.current_session_id == "shared"
+        assert bob.current_session_id == "bob_session"
+        assert [session.id for session in bob.sessions] == ["bob_session"]
 
 
 class TestSessionListLimits:
@@ -309,17 +568,35 @@ class TestSessionListLimits:
     @pytest.mark.asyncio
     async def test_session_list_pruned_at_limit(self, state_manager):
         """Session list should be pruned when exceeding MAX_SESSIONS."""
-        # Add more sessions than the limit
-        for i in range(MAX_SESSIONS + 20):
-            await state_manager.update_session("12345", f"session_{i}")
+        # Add more sessions than the limit in one bulk call
+        await state_manager.update_sessions_bulk(
+            [("12345", f"session_{i}") for i in range(MAX_SESSIONS + 20)]
+        )
 
         state = await state_manager.get_session_state("12345")
         assert len(state.sessions) == MAX_SESSIONS
         # Oldest sessions should be removed (FIFO)
-        session_ids = [session.id for session in state.sessions]
+        session_ids = {session.id for session in state.sessions}
         assert "session_0" not in session_ids
         assert f"session_{MAX_SESSIONS + 19}" in session_ids
 
+    @pytest.mark.asyncio
+    async def test_update_session_prunes_at_limit(self, state_manager):
+        """update_session evicts the least recently active session per call."""
+        async with state_manager.transaction():
+            for i in range(MAX_SESSIONS):
+                await state_manager.update_session("12345", f"session_{i}")
+            # Touch the oldest so the next new session evicts session_1
+            await state_manager.update_session("12345", "session_0")
+            await state_manager.update_session("12345", "session_new")
+
+        state = await state_manager.get_session_state("12345")
+        session_ids = {session.id for session in state.sessions}
+        assert len(session_ids) == MAX_SESSIONS
+        assert state.current_session_id == "session_new"
+        assert "session_0" in session_ids
+        assert "session_1" not in session_ids
+
 
 class TestMemoryOperations:
     """Tests for memory storage operations."""
@@ -347,8 +624,7 @@ class TestMemoryOperations:
 
         keys = await state_manager.list_memories("12345")
 
-        assert "key1" in keys
-        assert "key2" in keys
+        assert set(keys) == {"key1", "key2"}
 
     @pytest.mark.asyncio
     async def test_store_memory_updates_existing(self, state_manager):
@@ -358,3 +634,21 @@ class TestMemoryOperations:
 
         value = await state_manager.recall_memory("12345", "key")
         assert value == "updated"
+
+    @pytest.mark.asyncio
+    async def test_store_memory_single_statement(self, state_manager):
+        """store_memory overwrites an existing key with one UPSERT statement."""
+        await state_manager.store_memory("12345", "key", "original")
+        statements: list[str] = []
+
+        with state_manager._get_connection() as conn:
+            conn.set_trace_callback(statements.append)
+        try:
+            await state_manager.store_memory("12345", "key", "updated")
+        finally:
+            with state_manager._get_connection() as conn:
+                conn.set_trace_callback(None)
+
+        writes = [sql for sql in statements if "memory" in sql]
+        assert len(writes) == 1
+        assert "ON CONFLICT" in writes[0]
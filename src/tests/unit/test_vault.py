@@ -26,10 +26,11 @@ class TestVaultLoad:
         config = vault.load()
         assert config == VaultConfig()
 
-    def test_load_empty_when_config_is_null(self, tmp_path: Path):
+    @pytest.mark.parametrize("content", ["null", "~", "NULL\n", "  \n"])
+    def test_load_empty_when_config_is_null(self, tmp_path: Path, content: str):
         """Returns empty VaultConfig when config file contains only null."""
         config_file = tmp_path / "vault-config.yaml"
-        config_file.write_text("null")
+        config_file.write_text(content)
 
         vault = Vault(tmp_path)
         config = vault.load()
@@ -59,6 +60,15 @@ mcp_servers:
         with pytest.raises(VaultError, match="Invalid YAML"):
             vault.load()
 
+    def test_load_raises_on_invalid_encoding(self, tmp_path: Path):
+        """Raises VaultError when the file is not valid UTF-8."""
+        config_file = tmp_path / "vault-config.yaml"
+        config_file.write_bytes(b"agents: \xc3\x28")
+
+        vault = Vault(tmp_path)
+        with pytest.raises(VaultError, match="Invalid YAML"):
+            vault.load()
+
     def test_load_raises_on_non_dict_yaml(self, tmp_path: Path):
         """Raises VaultError when YAML is not a mapping."""
         config_file = tmp_path / "vault-config.yaml"
@@ -92,6 +102,23 @@ agents:
         assert config1 is config2
         assert "test" in config2.agents
 
+    def test_new_vault_reads_edited_prompt_file(self, tmp_path: Path):
+        """A fresh Vault picks up prompt file edits without config changes."""
+        (tmp_path / "prompts").mkdir()
+        prompt_file = tmp_path / "prompts" / "a.md"
+        prompt_file.write_text("OLD")
+        (tmp_path / "vault-config.yaml").write_text("""
+agents:
+  a:
+    prompt_file: ./prompts/a.md
+""")
+
+        assert Vault(tmp_path).load().agents["a"].prompt == "OLD"
+
+        prompt_file.write_text("NEW")
+
+        assert Vault(tmp_path).load().agents["a"].prompt == "NEW"
+
 
 class TestVaultReload:
     """Tests for Vault.reload() method."""
@@ -159,6 +186,23 @@ hooks:
         hook_cmd = config.hooks["PreToolUse"][0].hooks[0].command
         assert hook_cmd == str(tmp_path / "hooks" / "validate.sh")
 
+    def test_keeps_parent_segments_in_resolved_paths(self, tmp_path: Path):
+        """ ".." is kept rather than collapsed, as with pathlib joins."""
+        root = tmp_path / "vault"
+        root.mkdir()
+        (root / "vault-config.yaml").write_text("""
+mcp_servers:
+  sqlite:
+    command: "uvx"
+    args: ["--db-path", "./../shared//data.db"]
+""")
+        config = Vault(root).load()
+
+        assert config.mcp_servers["sqlite"].args == [
+            "--db-path",
+            str(root.resolve() / ".." / "shared" / "data.db"),
+        ]
+
     def test_preserves_absolute_mcp_paths(self, tmp_path: Path):
         """Absolute paths in MCP args are preserved."""
         config_file = tmp_path / "vault-config.yaml"